@@ -3,17 +3,22 @@ Script to clean up old query logs with Chinese error messages
 Run this script to remove or update old test data
 """
 import os
+import re
 import sys
 from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, update, text
 from sqlalchemy.orm import sessionmaker
 from backend.database.models import QueryLog
 from backend.config import get_settings
 
+# CJK Unified Ideographs
+_CJK_PATTERN = '[\u4e00-\u9fff]'
+_CJK_RE = re.compile(_CJK_PATTERN)
+
 
 def cleanup_query_logs(action: str = "delete"):
     """
@@ -29,23 +34,51 @@ def cleanup_query_logs(action: str = "delete"):
     
     try:
         if action == "delete":
-            # Delete all query logs
-            count = db.query(QueryLog).delete()
-            db.commit()
-            print(f"✅ Deleted {count} query logs")
+            if engine.dialect.name == "postgresql":
+                # TRUNCATE unlinks the table files instead of deleting row by row.
+                # It takes an ACCESS EXCLUSIVE lock, which is fine for a
+                # maintenance script.
+                db.execute(text("TRUNCATE TABLE query_logs RESTART IDENTITY"))
+                db.commit()
+                print("✅ Truncated query_logs")
+            else:
+                # Delete all query logs; the session is discarded afterwards so
+                # there is no in-session state worth synchronizing
+                count = db.query(QueryLog).delete(synchronize_session=False)
+                db.commit()
+                print(f"✅ Deleted {count} query logs")
             
         elif action == "update":
             # Update error messages containing Chinese characters
-            logs = db.query(QueryLog).filter(
-                QueryLog.error_message.isnot(None)
-            ).all()
+            stmt = (
+                update(QueryLog)
+                .values(error_message="Feature not implemented")
+                .execution_options(synchronize_session=False)
+            )
             
-            updated = 0
-            for log in logs:
-                if log.error_message and any('\u4e00' <= char <= '\u9fff' for char in log.error_message):
-                    # Contains Chinese characters
-                    log.error_message = "Feature not implemented"
-                    updated += 1
+            if engine.dialect.name == "postgresql":
+                # Single server-side statement; the regex is evaluated by PostgreSQL
+                result = db.execute(
+                    stmt.where(QueryLog.error_message.op('~')(_CJK_PATTERN))
+                )
+                updated = result.rowcount
+            else:
+                # No POSIX regex operator available - stream only the scalar
+                # columns we need and update matches in batches of 1000
+                rows = db.query(QueryLog.id, QueryLog.error_message).filter(
+                    QueryLog.error_message.isnot(None)
+                ).execution_options(stream_results=True).yield_per(1000)
+                
+                updated = 0
+                ids_to_update = []
+                for row in rows:
+                    if _CJK_RE.search(row.error_message):
+                        ids_to_update.append(row.id)
+                    if len(ids_to_update) >= 1000:
+                        updated += db.execute(stmt.where(QueryLog.id.in_(ids_to_update))).rowcount
+                        ids_to_update = []
+                if ids_to_update:
+                    updated += db.execute(stmt.where(QueryLog.id.in_(ids_to_update))).rowcount
             
             db.commit()
             print(f"✅ Updated {updated} query logs with Chinese error messages")
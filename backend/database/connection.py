@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
 from typing import Generator
+from backend.config import HNSW_M, HNSW_EF_CONSTRUCTION
 import os
 
 # Get database URL from environment variable
@@ -12,7 +13,20 @@ DATABASE_URL = os.environ.get(
 )
 
 # Create SQLAlchemy engine
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# psycopg2 batch mode folds executemany() INSERTs into multi-VALUES statements.
+# The pool is sized so concurrent requests holding a session while waiting on
+# Gemini do not queue behind the default pool_size=5.
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,
+    pool_timeout=10,
+    executemany_mode='values_plus_batch',
+    insertmanyvalues_page_size=1000,
+    executemany_batch_page_size=500
+)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -40,6 +54,85 @@ def get_db_context() -> Generator[Session, None, None]:
         db.close()
 
 
+@contextmanager
+def advisory_lock(key: int) -> Generator[None, None, None]:
+    """
+    Hold a PostgreSQL session-level advisory lock, blocking until acquired
+
+    Uses a dedicated connection so commits made by other sessions while the
+    lock is held cannot hand it back to the pool.
+    """
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': key})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+
+
+# Idempotent upgrades for databases created before the current schema
+# (create_all only creates missing tables, it never alters existing ones)
+SCHEMA_UPGRADES = (
+    # float32 vector -> halfvec; the old ivfflat/HNSW indexes use vector ops
+    # and would block the type change, so they are dropped and rebuilt
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'documents' AND column_name = 'embedding' AND udt_name = 'vector'
+        ) THEN
+            DROP INDEX IF EXISTS documents_embedding_idx;
+            DROP INDEX IF EXISTS ix_doc_embedding_hnsw;
+            ALTER TABLE documents ALTER COLUMN embedding TYPE halfvec(768) USING embedding::halfvec(768);
+        END IF;
+    END $$
+    """,
+    # Cosine-ops index, replaced by the inner-product index below
+    "DROP INDEX IF EXISTS ix_doc_embedding_hnsw",
+    # Unit-length embeddings, normalized once before the inner-product index is
+    # built (written normalized since), so later startups skip the table scan
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'ix_doc_embedding_hnsw_ip') THEN
+            UPDATE documents SET embedding = l2_normalize(embedding)
+            WHERE embedding IS NOT NULL AND abs(l2_norm(embedding) - 1) > 0.01;
+        END IF;
+    END $$
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS ix_doc_embedding_hnsw_ip ON documents
+    USING hnsw (embedding halfvec_ip_ops)
+    WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+    """,
+    # Context cache outcome, written with every query log
+    "ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS context_cache_hit BOOLEAN",
+    # No query filters on a created_at range or on failures; these only cost writes
+    "DROP INDEX IF EXISTS ix_qlog_created_model",
+    "DROP INDEX IF EXISTS ix_qlog_failures",
+    # Covering index for the grouped query stats
+    "CREATE INDEX IF NOT EXISTS ix_qlog_stats ON query_logs (model_used) INCLUDE (success, files_used, total_tokens)",
+    # Preview stored at write time; backfilled only when the column is added
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'documents' AND column_name = 'content_preview'
+        ) THEN
+            ALTER TABLE documents ADD COLUMN content_preview VARCHAR(203);
+            UPDATE documents
+            SET content_preview = CASE WHEN length(content) > 200 THEN left(content, 200) || '...' ELSE content END;
+        END IF;
+    END $$
+    """,
+)
+
+
 def init_db() -> None:
-    """Initialize database - create all tables"""
+    """Initialize database - create all tables and upgrade existing ones"""
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
@@ -7,16 +7,33 @@ CREATE TABLE IF NOT EXISTS documents (
     gemini_file_name VARCHAR(255) UNIQUE NOT NULL,
     display_name VARCHAR(255) NOT NULL,
     content TEXT NOT NULL,
-    embedding vector(768),
+    embedding halfvec(768),
     file_size INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Preview stored at write time so searches never read the full content (migration)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_preview VARCHAR(203);
+UPDATE documents
+SET content_preview = CASE WHEN length(content) > 200 THEN left(content, 200) || '...' ELSE content END
+WHERE content_preview IS NULL;
+
 -- Create index for vector similarity search
-CREATE INDEX IF NOT EXISTS documents_embedding_idx ON documents 
-USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- (inner product over unit-length embeddings)
+CREATE INDEX IF NOT EXISTS ix_doc_embedding_hnsw_ip ON documents 
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 24, ef_construction = 128);
+
+-- Document embeddings keyed by content hash (float32 bytes)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_sha256 BYTEA NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_sha256, model)
+);
 
 -- Create query logs table for usage statistics
 CREATE TABLE IF NOT EXISTS query_logs (
@@ -53,6 +70,10 @@ FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER;
 ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS completion_tokens INTEGER;
 ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS total_tokens INTEGER;
+ALTER TABLE query_logs ADD COLUMN IF NOT EXISTS context_cache_hit BOOLEAN;
 
 -- Create index for token statistics
 CREATE INDEX IF NOT EXISTS query_logs_total_tokens_idx ON query_logs(total_tokens) WHERE total_tokens IS NOT NULL;
+
+-- Covering index for per-model statistics (after the token columns exist)
+CREATE INDEX IF NOT EXISTS ix_qlog_stats ON query_logs(model_used) INCLUDE (success, files_used, total_tokens);
@@ -1,18 +1,35 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, ARRAY
+from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, ARRAY, Index, LargeBinary, case
+from sqlalchemy.orm import deferred, column_property
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
+from backend.config import CONTENT_PREVIEW_LENGTH, HNSW_M, HNSW_EF_CONSTRUCTION
 from .connection import Base
 
 
 class Document(Base):
     """Document model with vector embeddings"""
     __tablename__ = 'documents'
+    __table_args__ = (
+        # ANN index for similarity search over unit-length embeddings; ops must
+        # match max_inner_product() queries
+        Index(
+            'ix_doc_embedding_hnsw_ip',
+            'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': HNSW_M, 'ef_construction': HNSW_EF_CONSTRUCTION},
+            postgresql_ops={'embedding': 'halfvec_ip_ops'}
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     gemini_file_name = Column(String(255), unique=True, nullable=False, index=True)
     display_name = Column(String(255), nullable=False)
-    content = Column(Text, nullable=False)
-    embedding = Column(Vector(768))  # Gemini text-embedding-004 produces 768-dim vectors
+    # Large columns are deferred so listings don't pull them over the wire
+    content = deferred(Column(Text, nullable=False))
+    # Gemini text-embedding-004 produces 768-dim vectors, stored as FP16
+    embedding = deferred(Column(HALFVEC(768)))
+    # Written with the content so reads never touch the (TOASTed) content column
+    stored_preview = deferred(Column('content_preview', String(CONTENT_PREVIEW_LENGTH + 3)))
     file_size = Column(Integer)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -23,16 +40,59 @@ class Document(Base):
             'id': self.id,
             'gemini_file_name': self.gemini_file_name,
             'display_name': self.display_name,
-            'content_preview': self.content[:200] + '...' if len(self.content) > 200 else self.content,
+            'content_preview': self.content_preview,
             'file_size': self.file_size,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 
+def make_content_preview(content: str) -> str:
+    """Truncated content shown in listings and search results"""
+    if len(content) > CONTENT_PREVIEW_LENGTH:
+        return content[:CONTENT_PREVIEW_LENGTH] + '...'
+    return content
+
+
+# Stored preview, computed server-side only for rows written before the
+# column existed
+Document.content_preview = column_property(
+    func.coalesce(
+        Document.stored_preview,
+        case(
+            (
+                func.length(Document.content) > CONTENT_PREVIEW_LENGTH,
+                func.concat(func.left(Document.content, CONTENT_PREVIEW_LENGTH), '...')
+            ),
+            else_=Document.content
+        )
+    )
+)
+
+
+class EmbeddingCache(Base):
+    """Document embeddings keyed by content hash, reused across re-uploads and restarts"""
+    __tablename__ = 'embedding_cache'
+
+    content_sha256 = Column(LargeBinary(32), primary_key=True)
+    model = Column(String(100), primary_key=True)
+    dim = Column(Integer, nullable=False)
+    # float32 vector bytes
+    vector = Column(LargeBinary, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+
 class QueryLog(Base):
     """Query log model for usage statistics"""
     __tablename__ = 'query_logs'
+    __table_args__ = (
+        # Covers get_query_stats' grouped aggregates with an index-only scan
+        Index(
+            'ix_qlog_stats',
+            'model_used',
+            postgresql_include=['success', 'files_used', 'total_tokens']
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     query = Column(Text, nullable=False)
@@ -44,6 +104,7 @@ class QueryLog(Base):
     prompt_tokens = Column(Integer)
     completion_tokens = Column(Integer)
     total_tokens = Column(Integer)
+    context_cache_hit = Column(Boolean)
     success = Column(Boolean, default=True)
     error_message = Column(Text)
     created_at = Column(TIMESTAMP, server_default=func.now(), index=True)
@@ -61,6 +122,7 @@ class QueryLog(Base):
             'prompt_tokens': self.prompt_tokens,
             'completion_tokens': self.completion_tokens,
             'total_tokens': self.total_tokens,
+            'context_cache_hit': self.context_cache_hit,
             'success': self.success,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -1,13 +1,18 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from backend.routers import chat, files, search, stats
-from backend.models.schemas import HealthResponse, ErrorResponse
+from backend.models.schemas import HealthResponse, ErrorResponse, ModelsResponse
 from backend.services.rag_service import RAGService
 from backend.services.embedding_service import EmbeddingService
+from backend.services.embedding_store import EmbeddingStore
+from backend.services.embedding_batcher import EmbeddingBatcher
+from backend.services.query_log_writer import QueryLogWriter
+from backend.services.response_cache import response_cache
+from backend.services.redis_cache import RedisResponseCache
 from backend.services.document_service import DocumentService
-from backend.database.connection import get_db_context, init_db
-from backend.config import get_settings
+from backend.database.connection import get_db_context, init_db, advisory_lock
+from backend.config import get_settings, FILES_COUNT_CACHE_TTL, STARTUP_LOCK_KEY
 from backend.exceptions import (
     ServiceException,
     EmbeddingError,
@@ -17,17 +22,79 @@ from backend.exceptions import (
 )
 from backend.utils.logger import get_logger
 from backend.utils.startup import initialize_app
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
+import time
 
 # Load environment variables
 load_dotenv()
 
 logger = get_logger(__name__)
 
+
+def initialize_services(app: FastAPI) -> None:
+    """Create app-lifetime services, initialize database and auto-upload test data"""
+    # (files_count, fetched_at) - stale until the first health check refreshes it
+    app.state.files_count_cache = (0, 0.0)
+    app.state.query_log_writer = QueryLogWriter()
+    # (model list, model IDs, /models response), rebuilt when the model list is reloaded
+    app.state.models_snapshot = (None, frozenset(), ModelsResponse(models=[]))
+    app.state.shared_response_cache = None
+    
+    try:
+        settings = get_settings()
+        logger.info(f"API Key loaded: {settings.GOOGLE_API_KEY[:10]}...")
+        
+        # Shared services, reused by every request for the app lifetime
+        app.state.rag_service = RAGService(settings.GOOGLE_API_KEY)
+        app.state.embedding_service = EmbeddingService(settings.GOOGLE_API_KEY, store=EmbeddingStore())
+        app.state.embedding_batcher = EmbeddingBatcher(app.state.embedding_service)
+        if settings.REDIS_URL:
+            app.state.shared_response_cache = RedisResponseCache(settings.REDIS_URL, response_cache)
+        
+        # Load the model list up front so requests never wait on it
+        app.state.rag_service.get_available_models()
+        
+        # Initialize database and run startup tasks. With multiple uvicorn workers
+        # the advisory lock runs them one worker at a time, so test data is
+        # uploaded once and later workers find it already indexed.
+        try:
+            with advisory_lock(STARTUP_LOCK_KEY):
+                init_db()
+                logger.info("Database initialized successfully")
+                
+                # Run startup tasks
+                try:
+                    with get_db_context() as db:
+                        doc_service = DocumentService(db, app.state.embedding_service)
+                        
+                        initialize_app(db, app.state.rag_service, doc_service)
+                except Exception as e:
+                    logger.error(f"Startup initialization error: {e}", exc_info=True)
+        except Exception as e:
+            logger.error(f"Database initialization error: {e}", exc_info=True)
+            
+    except Exception as e:
+        logger.error(f"Fatal startup error: {e}", exc_info=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan - initialize on startup, flush query logs on shutdown"""
+    initialize_services(app)
+    yield
+    await app.state.query_log_writer.close()
+    if app.state.shared_response_cache is not None:
+        await app.state.shared_response_cache.close()
+
+
 app = FastAPI(
     title="Gemini RAG Chat API",
     description="RAG-based chat API with multi-model support and semantic search",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware for React frontend
@@ -37,6 +104,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset cursor for the next page of query history
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -45,7 +114,7 @@ app.add_middleware(
 async def embedding_error_handler(request: Request, exc: EmbeddingError):
     """Handle embedding generation errors"""
     logger.error(f"Embedding error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail, "error_type": "embedding_error"}
     )
@@ -55,7 +124,7 @@ async def embedding_error_handler(request: Request, exc: EmbeddingError):
 async def database_error_handler(request: Request, exc: DatabaseError):
     """Handle database operation errors"""
     logger.error(f"Database error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail, "error_type": "database_error"}
     )
@@ -65,7 +134,7 @@ async def database_error_handler(request: Request, exc: DatabaseError):
 async def model_validation_error_handler(request: Request, exc: ModelValidationError):
     """Handle model validation errors"""
     logger.warning(f"Model validation error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail, "error_type": "model_validation_error"}
     )
@@ -75,7 +144,7 @@ async def model_validation_error_handler(request: Request, exc: ModelValidationE
 async def file_upload_error_handler(request: Request, exc: FileUploadError):
     """Handle file upload errors"""
     logger.error(f"File upload error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail, "error_type": "file_upload_error"}
     )
@@ -85,7 +154,7 @@ async def file_upload_error_handler(request: Request, exc: FileUploadError):
 async def service_exception_handler(request: Request, exc: ServiceException):
     """Handle generic service exceptions"""
     logger.error(f"Service error: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail, "error_type": "service_error"}
     )
@@ -98,49 +167,22 @@ app.include_router(search.router)
 app.include_router(stats.router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize on startup - database and auto-upload test data"""
-    try:
-        settings = get_settings()
-        logger.info(f"API Key loaded: {settings.GOOGLE_API_KEY[:10]}...")
-        
-        # Initialize database
-        try:
-            init_db()
-            logger.info("Database initialized successfully")
-        except Exception as e:
-            logger.error(f"Database initialization error: {e}", exc_info=True)
-            return
-        
-        # Initialize services and run startup tasks
-        try:
-            with get_db_context() as db:
-                rag_service = RAGService(settings.GOOGLE_API_KEY)
-                embedding_service = EmbeddingService(settings.GOOGLE_API_KEY)
-                doc_service = DocumentService(db, embedding_service)
-                
-                initialize_app(db, rag_service, doc_service)
-        except Exception as e:
-            logger.error(f"Startup initialization error: {e}", exc_info=True)
-            
-    except Exception as e:
-        logger.error(f"Fatal startup error: {e}", exc_info=True)
-
-
 @app.get("/", response_model=HealthResponse)
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint"""
     try:
         settings = get_settings()
         api_configured = bool(settings.GOOGLE_API_KEY)
         
-        files_count = 0
-        try:
-            rag_service = RAGService(settings.GOOGLE_API_KEY)
-            files_count = len(rag_service.list_files())
-        except Exception as e:
-            logger.warning(f"Could not get file count: {e}")
+        # Serve file count from memory so frequent probes don't hit the Gemini API
+        files_count, fetched_at = getattr(request.app.state, 'files_count_cache', (0, 0.0))
+        if time.monotonic() - fetched_at > FILES_COUNT_CACHE_TTL:
+            try:
+                files = await asyncio.to_thread(request.app.state.rag_service.list_files)
+                files_count = len(files)
+                request.app.state.files_count_cache = (files_count, time.monotonic())
+            except Exception as e:
+                logger.warning(f"Could not get file count: {e}")
         
         return HealthResponse(
             status="healthy",
@@ -0,0 +1 @@
+"""API request/response models"""
@@ -0,0 +1,133 @@
+"""Pydantic schemas for API requests and responses"""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+from backend.config import DEFAULT_MODEL
+
+
+class HealthResponse(BaseModel):
+    """Health check response"""
+    status: str
+    api_configured: bool
+    uploaded_files_count: int
+
+
+class ErrorResponse(BaseModel):
+    """Error response body"""
+    detail: str
+    error_type: Optional[str] = None
+
+
+class ChatRequest(BaseModel):
+    """Chat request"""
+    message: str
+    model: str = DEFAULT_MODEL
+    selected_files: Optional[List[str]] = None
+    system_prompt: Optional[str] = None
+    enable_auto_retrieval: bool = True
+    # 0 or None means no limit on retrieved documents
+    top_k: Optional[int] = Field(5, ge=0)
+    similarity_threshold: Optional[float] = Field(0.7, ge=0, le=1)
+
+
+class RetrievedFile(BaseModel):
+    """File picked by auto-retrieval, with its similarity score"""
+    gemini_file_name: str
+    display_name: str
+    similarity_score: float
+
+
+class ChatResponse(BaseModel):
+    """Chat response"""
+    success: bool
+    message: str
+    response: Optional[str] = None
+    model_used: Optional[str] = None
+    files_used: int = 0
+    retrieved_files: Optional[List[RetrievedFile]] = None
+    auto_retrieval_enabled: bool = False
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+
+
+class ModelInfo(BaseModel):
+    """Available generation model"""
+    model_id: str
+    name: str
+    description: str
+
+
+class ModelsResponse(BaseModel):
+    """Available models response"""
+    models: List[ModelInfo]
+
+
+class FileInfo(BaseModel):
+    """Gemini file metadata"""
+    name: str
+    display_name: Optional[str] = None
+    uri: Optional[str] = None
+    size_bytes: Optional[int] = None
+    create_time: Optional[str] = None
+    state: Optional[str] = None
+
+
+class FileListResponse(BaseModel):
+    """File list response"""
+    files: List[FileInfo]
+    count: int
+
+
+class UploadResponse(BaseModel):
+    """File upload response"""
+    success: bool
+    message: str
+    file: Optional[FileInfo] = None
+
+
+class DeleteResponse(BaseModel):
+    """File deletion response"""
+    success: bool
+    message: str
+
+
+class SearchRequest(BaseModel):
+    """Semantic document search request"""
+    query: str
+    top_k: Optional[int] = Field(5, ge=1)
+    similarity_threshold: float = Field(0.7, ge=0, le=1)
+
+
+class SearchResult(BaseModel):
+    """Document matched by semantic search"""
+    document_id: int
+    display_name: str
+    gemini_file_name: str
+    content_preview: Optional[str] = None
+    similarity_score: float
+
+
+class SearchResponse(BaseModel):
+    """Semantic document search response"""
+    success: bool
+    results: List[SearchResult]
+    count: int
+
+
+class StatsResponse(BaseModel):
+    """Query statistics response"""
+    total_queries: int
+    successful_queries: int
+    success_rate: float
+    model_usage: Dict[str, int]
+    avg_files_used: float
+    total_tokens_used: int
+    avg_tokens_per_query: float
+
+
+class QueryHistoryResponse(BaseModel):
+    """Paginated query history response"""
+    history: List[Dict[str, Any]]
+    total: int
+    page: int
+    page_size: int
@@ -1,40 +1,74 @@
-from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from sqlalchemy.orm import Session
-from backend.models.schemas import ChatRequest, ChatResponse, ModelsResponse, ModelInfo
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from backend.models.schemas import ChatRequest, ChatResponse, ModelsResponse, ModelInfo, RetrievedFile
 from backend.services.rag_service import RAGService
 from backend.services.embedding_service import EmbeddingService
 from backend.services.document_service import DocumentService
-from backend.database.connection import get_db
-from backend.config import get_settings, Settings
+from backend.services.response_cache import response_cache
+from backend.services.query_log_writer import QueryLogWriter
+from backend.routers.dependencies import get_rag_service, get_embedding_service, get_document_service
+from backend.database.connection import get_db_context
+from backend.database.models import Document
+from backend.config import DEFAULT_MODEL
 from backend.utils.logger import get_logger
-import json
+from typing import List, Dict, Any, Optional, AsyncGenerator, FrozenSet, Tuple, Union
+import asyncio
+import logging
+import msgpack
+import orjson
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 logger = get_logger(__name__)
 
 
-# Dependency functions
-def get_rag_service(settings: Settings = Depends(get_settings)) -> RAGService:
-    """Get RAG service instance"""
-    return RAGService(settings.GOOGLE_API_KEY)
+def search_documents(embedding_service: EmbeddingService, **search_kwargs) -> List[Tuple[Document, float]]:
+    """Run a similarity search on a short-lived session (returned to the pool on exit)"""
+    with get_db_context() as db:
+        return DocumentService(db, embedding_service).search_similar_documents(**search_kwargs)
 
 
-def get_embedding_service(settings: Settings = Depends(get_settings)) -> EmbeddingService:
-    """Get embedding service instance"""
-    return EmbeddingService(settings.GOOGLE_API_KEY)
+def get_models_snapshot(http_request: Request, rag_service: RAGService) -> Tuple[Any, FrozenSet[str], ModelsResponse]:
+    """
+    Get model IDs and the /models response for the service's current model list
+    
+    Both are rebuilt only when the service has reloaded its model list, so
+    requests validate against a prebuilt set without waiting on the API.
+    
+    Returns:
+        Tuple of (model list the snapshot was built from, model IDs, /models response)
+    """
+    models = rag_service.get_available_models()
+    snapshot = http_request.app.state.models_snapshot
+    if snapshot[0] is not models:
+        snapshot = (
+            models,
+            frozenset(model['model_id'] for model in models),
+            ModelsResponse(models=[
+                ModelInfo(
+                    model_id=model["model_id"],
+                    name=model["name"],
+                    description=model["description"]
+                )
+                for model in models
+            ])
+        )
+        http_request.app.state.models_snapshot = snapshot
+    return snapshot
 
 
-def get_document_service(
-    db: Session = Depends(get_db),
-    embedding_service: EmbeddingService = Depends(get_embedding_service)
-) -> DocumentService:
-    """Get document service instance"""
-    return DocumentService(db, embedding_service)
+async def get_request_files(http_request: Request, rag_service: RAGService) -> List[Dict[str, Any]]:
+    """Get uploaded file list, fetched from Gemini (in a worker thread) at most once per request"""
+    if not hasattr(http_request.state, 'files'):
+        http_request.state.files = await asyncio.to_thread(rag_service.list_files)
+    return http_request.state.files
 
 
 @router.post("", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
     rag_service: RAGService = Depends(get_rag_service),
     doc_service: DocumentService = Depends(get_document_service)
 ):
@@ -42,82 +76,111 @@ async def chat(
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
-    # Validate model
-    available_models = rag_service.get_available_models()
-    available_model_ids = [m['model_id'] for m in available_models]
-    
-    if request.model not in available_model_ids:
+    # Validate model against the cached model list
+    if request.model not in get_models_snapshot(http_request, rag_service)[1]:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported model: {request.model}. Please choose from available models."
         )
     
+    # Serve repeated queries from the response cache (exact match first)
+    cache_scope = (
+        request.model,
+        request.system_prompt,
+        tuple(request.selected_files or ()),
+        request.enable_auto_retrieval,
+        request.top_k,
+        request.similarity_threshold
+    )
+    # The shared tier (if configured) is checked first: it also carries the
+    # cluster-wide cache version, which drops stale local entries
+    # Cache hits are logged too, so usage statistics include the traffic they absorb
+    query_log_writer = http_request.app.state.query_log_writer
+    shared_cache = http_request.app.state.shared_response_cache
+    shared_version = None
+    if shared_cache is not None:
+        shared_response, shared_version = await shared_cache.get(cache_scope, request.message)
+        if shared_response is not None:
+            log_cached_response(
+                query_log_writer, request.message, request.model,
+                request.selected_files, request.system_prompt, shared_response
+            )
+            return ChatResponse(**shared_response)
+    
+    cached_response = response_cache.get(cache_scope, request.message)
+    if cached_response is not None:
+        log_cached_response(
+            query_log_writer, request.message, request.model,
+            request.selected_files, request.system_prompt, cached_response.model_dump()
+        )
+        return cached_response
+    
+    # Embed the query once; reused for the semantic cache tier and retrieval
+    query_embedding = None
+    if not request.selected_files and request.enable_auto_retrieval:
+        try:
+            query_embedding = await http_request.app.state.embedding_batcher.embed(request.message)
+        except Exception as e:
+            logger.warning(f"Query embedding failed, skipping semantic cache: {e}")
+        
+        if query_embedding is not None:
+            cached_response = response_cache.get(cache_scope, request.message, query_embedding)
+            if cached_response is not None:
+                log_cached_response(
+                    query_log_writer, request.message, request.model,
+                    request.selected_files, request.system_prompt, cached_response.model_dump()
+                )
+                return cached_response
+    
     # Auto-retrieve relevant documents using vector search if no files manually selected
     selected_files = request.selected_files
-    retrieved_files_info = None
+    similar_docs = None
     
     # DEBUG: 詳細記錄自動檢索條件
-    logger.info(f"[POST AUTO-RETRIEVAL CHECK] selected_files={selected_files}, enable_auto_retrieval={request.enable_auto_retrieval}")
-    logger.info(f"[POST PARAMS] top_k={request.top_k}, similarity_threshold={request.similarity_threshold}")
+    logger.debug("[POST AUTO-RETRIEVAL CHECK] selected_files=%s, enable_auto_retrieval=%s", selected_files, request.enable_auto_retrieval)
+    logger.debug("[POST PARAMS] top_k=%s, similarity_threshold=%s", request.top_k, request.similarity_threshold)
     
     if not selected_files and request.enable_auto_retrieval:
-        logger.info("[POST AUTO-RETRIEVAL] Starting automatic document retrieval...")
+        logger.debug("[POST AUTO-RETRIEVAL] Starting automatic document retrieval...")
         try:
-            # Use user's settings for retrieval
-            similar_docs = doc_service.search_similar_documents(
+            # Use user's settings for retrieval; the search runs in a worker
+            # thread so the event loop keeps serving other requests
+            similar_docs = await asyncio.to_thread(
+                doc_service.search_similar_documents,
                 query=request.message,
                 top_k=request.top_k if request.top_k else None,
-                similarity_threshold=request.similarity_threshold if request.similarity_threshold is not None else 0.0
+                similarity_threshold=request.similarity_threshold if request.similarity_threshold is not None else 0.0,
+                query_embedding=query_embedding
             )
             if similar_docs:
                 selected_files = [doc.gemini_file_name for doc, score in similar_docs]
-                retrieved_files_info = [(doc.gemini_file_name, doc.display_name, float(score)) for doc, score in similar_docs]
-                logger.info(f"[POST AUTO-RETRIEVAL SUCCESS] Retrieved {len(retrieved_files_info)} documents (top_k={request.top_k}, threshold={request.similarity_threshold})")
+                logger.debug("[POST AUTO-RETRIEVAL SUCCESS] Retrieved %d documents (top_k=%s, threshold=%s)", len(similar_docs), request.top_k, request.similarity_threshold)
             else:
                 logger.warning("[POST AUTO-RETRIEVAL] No documents found matching criteria")
         except Exception as e:
             logger.error(f"[POST AUTO-RETRIEVAL ERROR] {e}", exc_info=True)
     else:
         if selected_files:
-            logger.info(f"[POST MANUAL MODE] Using {len(selected_files)} manually selected files")
+            logger.debug("[POST MANUAL MODE] Using %d manually selected files", len(selected_files))
         else:
             logger.warning("[POST AUTO-RETRIEVAL DISABLED] No files will be used!")
     
-    # Query with specified model, files, and system prompt
-    result = rag_service.query(
+    # Query with specified model, files, and system prompt; the Gemini call
+    # blocks, so it runs in a worker thread to keep the event loop serving
+    result = await asyncio.to_thread(
+        rag_service.query,
         query=request.message,
         model_name=request.model,
         selected_file_names=selected_files,
-        system_prompt=request.system_prompt
+        system_prompt=request.system_prompt,
+        available_files=await get_request_files(http_request, rag_service) if selected_files else None
     )
     
-    # Add retrieval info to result
-    # Filter and deduplicate retrieved files
-    if retrieved_files_info:
-        # Get list of available files from RAG service
-        available_files = rag_service.list_files()
-        available_file_names = {f['name'] for f in available_files}
-        
-        # Filter retrieved_files to only include files that are available
-        filtered_retrieved_files = [
-            f for f in retrieved_files_info 
-            if f[0] in available_file_names
-        ]
-        
-        # Deduplicate files - keep only the highest similarity score for each unique display_name
-        file_map = {}
-        for gemini_name, display_name, score in filtered_retrieved_files:
-            if display_name not in file_map or score > file_map[display_name][2]:
-                file_map[display_name] = (gemini_name, display_name, score)
-        
-        result['retrieved_files'] = list(file_map.values())
-        result['auto_retrieval_enabled'] = True
-    else:
-        result['auto_retrieval_enabled'] = request.enable_auto_retrieval and not request.selected_files
+    auto_retrieval_enabled = bool(similar_docs) or (request.enable_auto_retrieval and not request.selected_files)
     
-    # Log the query
+    # Log the query off the request path (batched by the shared writer)
     try:
-        doc_service.log_query(
+        query_log_writer.submit(
             query=request.message,
             model_used=result.get("model_used", request.model),
             files_used=result.get("files_used", 0),
@@ -128,7 +191,8 @@ async def chat(
             completion_tokens=result.get("completion_tokens"),
             total_tokens=result.get("total_tokens"),
             success=result["success"],
-            error_message=result.get("message") if not result["success"] else None
+            error_message=result.get("message") if not result["success"] else None,
+            context_cache_hit=result.get("context_cache_hit")
         )
     except Exception as log_error:
         logger.warning(f"Failed to log query: {log_error}")
@@ -138,92 +202,326 @@ async def chat(
             raise HTTPException(status_code=429, detail=result.get("message", "Rate limit exceeded"))
         raise HTTPException(status_code=500, detail=result.get("response", "Query failed"))
     
-    # Convert retrieved_files to RetrievedFile objects
-    from backend.models.schemas import RetrievedFile
+    # Build RetrievedFile objects straight from the search results, keeping
+    # files that are still available and the best score per display_name
     retrieved_files_data = None
-    if result.get("retrieved_files"):
-        retrieved_files_data = [
-            RetrievedFile(
-                gemini_file_name=f[0],
-                display_name=f[1],
-                similarity_score=f[2]
-            )
-            for f in result["retrieved_files"]
-        ]
+    if similar_docs:
+        # Already fetched for the query above
+        available_file_names = {f['name'] for f in await get_request_files(http_request, rag_service)}
+        file_map: Dict[str, RetrievedFile] = {}
+        for doc, score in similar_docs:
+            if doc.gemini_file_name not in available_file_names:
+                continue
+            score = float(score)
+            best = file_map.get(doc.display_name)
+            if best is None or score > best.similarity_score:
+                file_map[doc.display_name] = RetrievedFile(
+                    gemini_file_name=doc.gemini_file_name,
+                    display_name=doc.display_name,
+                    similarity_score=score
+                )
+        retrieved_files_data = list(file_map.values()) or None
     
-    return ChatResponse(
+    response = ChatResponse(
         success=result["success"],
         message=result.get("response", ""),
         response=result.get("response", ""),
         model_used=result.get("model_used"),
         files_used=result.get("files_used", 0),
         retrieved_files=retrieved_files_data,
-        auto_retrieval_enabled=result.get("auto_retrieval_enabled"),
+        auto_retrieval_enabled=auto_retrieval_enabled,
         prompt_tokens=result.get("prompt_tokens"),
         completion_tokens=result.get("completion_tokens"),
         total_tokens=result.get("total_tokens")
     )
+    
+    response_cache.put(cache_scope, request.message, response, query_embedding)
+    if shared_version is not None:
+        background_tasks.add_task(
+            shared_cache.put, cache_scope, request.message, response.model_dump(), shared_version
+        )
+    return response
 
 
-@router.get("/models", response_model=ModelsResponse)
-async def get_available_models(rag_service: RAGService = Depends(get_rag_service)):
-    """Get list of available Gemini models"""
-    models = rag_service.get_available_models()
+def log_cached_response(
+    query_log_writer: QueryLogWriter,
+    message: str,
+    model: str,
+    selected_files: Optional[List[str]],
+    system_prompt: Optional[str],
+    cached: Dict[str, Any]
+) -> None:
+    """Log a query answered from the response cache, with the cached response's usage"""
+    response_text = cached.get('response') or cached.get('full_response') or ''
+    try:
+        query_log_writer.submit(
+            query=message,
+            model_used=cached.get('model_used') or model,
+            files_used=cached.get('files_used') or 0,
+            selected_files=selected_files,
+            system_prompt_used=system_prompt,
+            response_length=len(response_text),
+            prompt_tokens=cached.get('prompt_tokens'),
+            completion_tokens=cached.get('completion_tokens'),
+            total_tokens=cached.get('total_tokens'),
+            success=True
+        )
+    except Exception as log_error:
+        logger.warning(f"Failed to log query: {log_error}")
+
+
+async def log_stream_query(
+    query_log_writer: QueryLogWriter,
+    request: ChatRequest,
+    selected_files: Optional[List[str]],
+    outcome: Dict[str, Any]
+) -> None:
+    """Log a streamed query once the response has been sent"""
+    try:
+        query_log_writer.submit(
+            query=request.message,
+            model_used=request.model,
+            files_used=outcome.get('files_used', 0),
+            selected_files=selected_files,
+            system_prompt_used=outcome.get('system_prompt_used', request.system_prompt),
+            response_length=len(outcome.get('full_response', '')),
+            prompt_tokens=outcome.get('prompt_tokens'),
+            completion_tokens=outcome.get('completion_tokens'),
+            total_tokens=outcome.get('total_tokens'),
+            success=outcome.get('error') is None,
+            error_message=outcome.get('error'),
+            context_cache_hit=outcome.get('context_cache_hit')
+        )
+    except Exception as log_error:
+        logger.warning(f"Failed to log query: {log_error}")
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    rag_service: RAGService = Depends(get_rag_service),
+    doc_service: DocumentService = Depends(get_document_service)
+):
+    """Send a message and stream the RAG-based response as Server-Sent Events"""
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
     
-    model_list = [
-        ModelInfo(
-            model_id=model["model_id"],
-            name=model["name"],
-            description=model["description"]
+    # Validate model against the cached model list
+    if request.model not in get_models_snapshot(http_request, rag_service)[1]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported model: {request.model}. Please choose from available models."
         )
-        for model in models
-    ]
     
-    return ModelsResponse(models=model_list)
+    # Auto-retrieve relevant documents using vector search if no files manually selected
+    selected_files = request.selected_files
+    retrieved_files = []
+    if not selected_files and request.enable_auto_retrieval:
+        try:
+            query_embedding = await http_request.app.state.embedding_batcher.embed(request.message)
+            similar_docs = await asyncio.to_thread(
+                doc_service.search_similar_documents,
+                query=request.message,
+                top_k=request.top_k if request.top_k else None,
+                similarity_threshold=request.similarity_threshold if request.similarity_threshold is not None else 0.0,
+                query_embedding=query_embedding
+            )
+            selected_files = [doc.gemini_file_name for doc, score in similar_docs]
+            retrieved_files = [
+                {
+                    'gemini_file_name': doc.gemini_file_name,
+                    'display_name': doc.display_name,
+                    'similarity_score': float(score)
+                }
+                for doc, score in similar_docs
+            ]
+        except Exception as e:
+            logger.error(f"[STREAM AUTO-RETRIEVAL ERROR] {e}", exc_info=True)
+    
+    # Filled in while streaming, read by the logging task after the response closes
+    outcome: Dict[str, Any] = {'full_response': ''}
+    
+    async def event_stream() -> AsyncGenerator[str, None]:
+        yield f"data: {orjson.dumps({'type': 'retrieval', 'retrieved_files': retrieved_files}).decode()}\n\n"
+        
+        async for chunk_data in rag_service.query_stream(
+            query=request.message,
+            model_name=request.model,
+            selected_file_names=selected_files or None,
+            system_prompt=request.system_prompt
+        ):
+            if chunk_data['type'] == 'chunk':
+                outcome['full_response'] += chunk_data['text']
+                outcome['files_used'] = chunk_data['files_used']
+            elif chunk_data['type'] == 'complete':
+                outcome.update(
+                    (key, chunk_data.get(key))
+                    for key in (
+                        'system_prompt_used', 'prompt_tokens', 'completion_tokens',
+                        'total_tokens', 'context_cache_hit'
+                    )
+                )
+            elif chunk_data['type'] == 'error':
+                outcome['error'] = chunk_data['error']
+            yield f"data: {orjson.dumps(chunk_data).decode()}\n\n"
+    
+    background_tasks.add_task(
+        log_stream_query, http_request.app.state.query_log_writer, request, selected_files, outcome
+    )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        background=background_tasks
+    )
 
 
-@router.websocket("/ws")
-async def websocket_chat(
-    websocket: WebSocket,
-    settings: Settings = Depends(get_settings)
+@router.get("/models", response_model=ModelsResponse)
+async def get_available_models(
+    http_request: Request,
+    rag_service: RAGService = Depends(get_rag_service)
 ):
-    """WebSocket endpoint for real-time chat with streaming responses"""
-    await websocket.accept()
+    """Get list of available Gemini models (rebuilt only when the model list changes)"""
+    return get_models_snapshot(http_request, rag_service)[2]
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(
+    http_request: Request,
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
+    """Get query embedding cache and batching statistics"""
+    return {
+        'embedding_cache': embedding_service.stats(),
+        'embedding_batches': http_request.app.state.embedding_batcher.stats()
+    }
+
+
+class WsChatRequest(BaseModel):
+    """Chat message received over the WebSocket (same fields as ChatRequest)"""
+    model_config = ConfigDict(extra='ignore')
+    
+    message: str = ''
+    model: str = DEFAULT_MODEL
+    selected_files: Optional[List[str]] = None
+    system_prompt: Optional[str] = None
+    enable_auto_retrieval: bool = True
+    # 0 or None means no limit on retrieved documents
+    top_k: Optional[int] = Field(5, ge=0)
+    similarity_threshold: Optional[float] = Field(0.7, ge=0, le=1)
+
+
+# WebSocket subprotocol for binary MessagePack frames; clients that don't
+# request it get JSON text frames
+WS_MSGPACK_SUBPROTOCOL = 'msgpack'
+
+
+async def send_ws_message(websocket: WebSocket, payload: Dict[str, Any]) -> None:
+    """Send a frame in the connection's negotiated encoding (MessagePack or orjson JSON)"""
+    if websocket.state.msgpack:
+        await websocket.send_bytes(msgpack.packb(payload))
+    else:
+        await websocket.send_text(orjson.dumps(payload).decode())
+
+
+async def receive_ws_message(websocket: WebSocket) -> Union[str, bytes]:
+    """Receive a text or binary frame, raising WebSocketDisconnect on close"""
+    message = await websocket.receive()
+    if message['type'] == 'websocket.disconnect':
+        raise WebSocketDisconnect(message.get('code', 1000))
+    if message.get('text') is not None:
+        return message['text']
+    return message.get('bytes') or b''
+
+
+def parse_ws_request(data: Union[str, bytes]) -> WsChatRequest:
+    """
+    Validate a chat request frame
     
-    # Initialize services for this connection
-    rag_service = RAGService(settings.GOOGLE_API_KEY)
-    embedding_service = EmbeddingService(settings.GOOGLE_API_KEY)
+    Args:
+        data: JSON text frame or MessagePack binary frame
+        
+    Returns:
+        Validated request
+        
+    Raises:
+        ValidationError: If the payload is malformed or invalid
+    """
+    if isinstance(data, bytes):
+        try:
+            payload = msgpack.unpackb(data)
+        except Exception as e:
+            raise ValidationError.from_exception_data('WsChatRequest', [
+                {'type': 'value_error', 'loc': (), 'input': data, 'ctx': {'error': f'Invalid MessagePack ({type(e).__name__})'}}
+            ])
+        return WsChatRequest.model_validate(payload)
+    # One pass with pydantic-core's JSON parser
+    return WsChatRequest.model_validate_json(data)
+
+
+async def send_cached_ws_response(websocket: WebSocket, completion_data: Dict[str, Any]) -> None:
+    """Replay a cached completion as one stream frame followed by the completion frame"""
+    await send_ws_message(websocket, {
+        'type': 'stream',
+        'chunk': completion_data['full_response'],
+        'model_used': completion_data['model_used'],
+        'files_used': completion_data['files_used']
+    })
+    await send_ws_message(websocket, completion_data)
+
+
+@router.websocket("/ws")
+async def websocket_chat(websocket: WebSocket):
+    """WebSocket endpoint for real-time chat with streaming responses"""
+    # Binary MessagePack frames if the client asks for them, JSON text otherwise
+    websocket.state.msgpack = WS_MSGPACK_SUBPROTOCOL in websocket.scope.get('subprotocols', [])
+    await websocket.accept(subprotocol=WS_MSGPACK_SUBPROTOCOL if websocket.state.msgpack else None)
     
-    # Get database session for this connection
-    db = next(get_db())
-    doc_service = DocumentService(db, embedding_service)
+    # Shared services created at startup
+    rag_service = websocket.app.state.rag_service
+    embedding_service = websocket.app.state.embedding_service
+    embedding_batcher = websocket.app.state.embedding_batcher
+    query_log_writer = websocket.app.state.query_log_writer
+    shared_cache = websocket.app.state.shared_response_cache
     
     try:
         while True:
             # Receive message from client
-            data = await websocket.receive_text()
+            data = await receive_ws_message(websocket)
             
             # Handle heartbeat ping/pong
             if data == 'ping':
                 await websocket.send_text('pong')
                 continue
             
-            logger.debug(f"WebSocket received data: {data[:100]}...")
-            request_data = json.loads(data)
+            logger.debug("WebSocket received data: %.100r...", data)
             
-            message = request_data.get('message', '').strip()
-            model = request_data.get('model', 'gemini-1.5-flash')
-            selected_files = request_data.get('selected_files', None)
-            system_prompt = request_data.get('system_prompt', None)
-            enable_auto_retrieval = request_data.get('enable_auto_retrieval', True)
-            top_k = request_data.get('top_k', 5)
-            similarity_threshold = request_data.get('similarity_threshold', 0.7)
+            try:
+                chat_request = parse_ws_request(data)
+            except ValidationError as ve:
+                await send_ws_message(websocket, {
+                    'type': 'error',
+                    'message': 'Invalid request: ' + '; '.join(
+                        f"{'.'.join(map(str, err['loc'])) or 'body'}: {err['msg']}" for err in ve.errors()
+                    )
+                })
+                continue
+            
+            message = chat_request.message.strip()
+            model = chat_request.model
+            selected_files = chat_request.selected_files
+            system_prompt = chat_request.system_prompt
+            enable_auto_retrieval = chat_request.enable_auto_retrieval
+            top_k = chat_request.top_k
+            similarity_threshold = chat_request.similarity_threshold
             
             # Debug logging for retrieval parameters
-            logger.info(f"WebSocket retrieval params - top_k: {top_k} (type: {type(top_k)}), similarity_threshold: {similarity_threshold}")
+            logger.debug("WebSocket retrieval params - top_k: %r, similarity_threshold: %r", top_k, similarity_threshold)
             
             if not message:
-                await websocket.send_json({
+                await send_ws_message(websocket, {
                     'type': 'error',
                     'message': '訊息不能為空'
                 })
@@ -231,40 +529,99 @@ async def websocket_chat(
             
             try:
                 # Send status update
-                await websocket.send_json({
+                await send_ws_message(websocket, {
                     'type': 'status',
                     'message': '正在處理您的請求...'
                 })
                 
+                # Repeated queries replay a cached completion; scoped apart from
+                # POST /chat since the cached value is the completion frame
+                cache_scope = (
+                    'ws',
+                    model,
+                    system_prompt,
+                    tuple(selected_files or ()),
+                    enable_auto_retrieval,
+                    top_k,
+                    similarity_threshold
+                )
+                shared_version = None
+                if shared_cache is not None:
+                    cached_completion, shared_version = await shared_cache.get(cache_scope, message)
+                    if cached_completion is not None:
+                        await send_cached_ws_response(websocket, cached_completion)
+                        log_cached_response(
+                            query_log_writer, message, model, selected_files, system_prompt, cached_completion
+                        )
+                        continue
+                
+                cached_completion = response_cache.get(cache_scope, message)
+                if cached_completion is not None:
+                    await send_cached_ws_response(websocket, cached_completion)
+                    log_cached_response(
+                        query_log_writer, message, model, selected_files, system_prompt, cached_completion
+                    )
+                    continue
+                
                 # Auto-retrieve relevant documents using vector search if no files manually selected
                 retrieved_files = None
                 auto_retrieval_enabled_result = False
                 
                 # DEBUG: 詳細記錄自動檢索條件
-                logger.info(f"[AUTO-RETRIEVAL CHECK] selected_files={selected_files}, enable_auto_retrieval={enable_auto_retrieval}")
-                logger.info(f"[WS PARAMS] top_k={top_k}, similarity_threshold={similarity_threshold}")
+                logger.debug("[AUTO-RETRIEVAL CHECK] selected_files=%s, enable_auto_retrieval=%s", selected_files, enable_auto_retrieval)
+                
+                # Fetch the uploaded file list in a worker thread while retrieval runs
+                files_task = None
+                if selected_files or enable_auto_retrieval:
+                    files_task = asyncio.create_task(asyncio.to_thread(rag_service.list_files))
                 
+                query_embedding = None
                 if not selected_files and enable_auto_retrieval:
-                    logger.info("[AUTO-RETRIEVAL] Starting automatic document retrieval...")
+                    logger.debug("[AUTO-RETRIEVAL] Starting automatic document retrieval...")
                     try:
-                        # Use user's settings for retrieval
-                        similar_docs = doc_service.search_similar_documents(
+                        # Query embeddings are batched across concurrent connections
+                        query_embedding = await embedding_batcher.embed(message)
+                        
+                        # Near-duplicate of a recent query: skip retrieval and generation
+                        cached_completion = response_cache.get(cache_scope, message, query_embedding)
+                        if cached_completion is not None:
+                            if files_task:
+                                files_task.cancel()
+                            await send_cached_ws_response(websocket, cached_completion)
+                            log_cached_response(
+                                query_log_writer, message, model, selected_files, system_prompt, cached_completion
+                            )
+                            continue
+                        
+                        # Use user's settings for retrieval; a session is checked out only
+                        # for the search so idle connections don't hold a pooled connection
+                        similar_docs = await asyncio.to_thread(
+                            search_documents,
+                            embedding_service,
                             query=message,
                             top_k=top_k if top_k else None,
-                            similarity_threshold=similarity_threshold if similarity_threshold is not None else 0.0
+                            similarity_threshold=similarity_threshold if similarity_threshold is not None else 0.0,
+                            query_embedding=query_embedding
                         )
                         if similar_docs:
                             selected_files = [doc.gemini_file_name for doc, score in similar_docs]
-                            retrieved_files = [(doc.gemini_file_name, doc.display_name, float(score)) for doc, score in similar_docs]
+                            retrieved_files = [
+                                {
+                                    'gemini_file_name': doc.gemini_file_name,
+                                    'display_name': doc.display_name,
+                                    'similarity_score': float(score)
+                                }
+                                for doc, score in similar_docs
+                            ]
                             auto_retrieval_enabled_result = True
-                            logger.info(f"[AUTO-RETRIEVAL SUCCESS] Retrieved {len(retrieved_files)} documents (top_k={top_k}, threshold={similarity_threshold})")
+                            logger.debug("[AUTO-RETRIEVAL SUCCESS] Retrieved %d documents (top_k=%s, threshold=%s)", len(retrieved_files), top_k, similarity_threshold)
                         else:
                             logger.warning("[AUTO-RETRIEVAL] No documents found matching criteria")
                     except Exception as e:
                         logger.error(f"[AUTO-RETRIEVAL ERROR] {e}", exc_info=True)
                 else:
                     if selected_files:
-                        logger.info(f"[MANUAL MODE] Using {len(selected_files)} manually selected files")
+                        logger.debug("[MANUAL MODE] Using %d manually selected files", len(selected_files))
                     else:
                         logger.warning("[AUTO-RETRIEVAL DISABLED] enable_auto_retrieval=False, no files will be used!")
                 
@@ -275,16 +632,22 @@ async def websocket_chat(
                 total_tokens = 0
                 files_used = 0
                 system_prompt_used = None
+                context_cache_hit = None
+                stream_failed = False
+                
+                # File list fetched once per message (prefetched above); reused when filtering below
+                available_files = await files_task if files_task else None
                 
-                for chunk_data in rag_service.query_stream(
+                # query_stream already coalesces small token deltas, one frame per chunk
+                async for chunk_data in rag_service.query_stream(
                     query=message,
                     model_name=model,
                     selected_file_names=selected_files,
-                    system_prompt=system_prompt
+                    system_prompt=system_prompt,
+                    available_files=available_files
                 ):
                     if chunk_data['type'] == 'chunk':
-                        # Send each chunk to client immediately
-                        await websocket.send_json({
+                        await send_ws_message(websocket, {
                             'type': 'stream',
                             'chunk': chunk_data['text'],
                             'model_used': chunk_data['model_used'],
@@ -299,17 +662,19 @@ async def websocket_chat(
                         completion_tokens = chunk_data.get('completion_tokens', 0)
                         total_tokens = chunk_data.get('total_tokens', 0)
                         system_prompt_used = chunk_data.get('system_prompt_used')
+                        context_cache_hit = chunk_data.get('context_cache_hit')
                         
                     elif chunk_data['type'] == 'error':
                         # Handle streaming error
-                        await websocket.send_json({
+                        stream_failed = True
+                        await send_ws_message(websocket, {
                             'type': 'error',
                             'message': f'發生錯誤: {chunk_data["error"]}'
                         })
                         
-                        # Log failed query
+                        # Log failed query (written in the background)
                         try:
-                            doc_service.log_query(
+                            query_log_writer.submit(
                                 query=message,
                                 model_used=model,
                                 success=False,
@@ -319,7 +684,7 @@ async def websocket_chat(
                                 error_message=chunk_data['error']
                             )
                         except Exception as log_error:
-                            print(f"⚠️ 記錄查詢失敗: {log_error}")
+                            logger.warning(f"Failed to log query: {log_error}")
                         break
                 
                 # If we got a full response, send completion signal
@@ -339,42 +704,47 @@ async def websocket_chat(
                     # Add retrieved files info if available
                     # Filter and deduplicate retrieved files
                     if retrieved_files:
-                        logger.info(f"Before filtering: {len(retrieved_files)} files")
-                        # Get list of available files from RAG service
-                        available_files = rag_service.list_files()
+                        logger.debug("Before filtering: %d files", len(retrieved_files))
+                        # Get list of available files (fetched for the query above)
+                        if available_files is None:
+                            available_files = await asyncio.to_thread(rag_service.list_files)
                         available_file_names = {f['name'] for f in available_files}
                         
                         # Filter retrieved_files to only include files that are available
                         filtered_retrieved_files = [
                             f for f in retrieved_files 
-                            if f[0] in available_file_names
+                            if f['gemini_file_name'] in available_file_names
                         ]
-                        logger.info(f"After filtering: {len(filtered_retrieved_files)} files")
+                        logger.debug("After filtering: %d files", len(filtered_retrieved_files))
                         
                         # Deduplicate files - keep only the highest similarity score for each unique display_name
                         file_map = {}
-                        for gemini_name, display_name, score in filtered_retrieved_files:
-                            if display_name not in file_map or score > file_map[display_name][2]:
-                                file_map[display_name] = (gemini_name, display_name, score)
+                        for f in filtered_retrieved_files:
+                            display_name = f['display_name']
+                            if display_name not in file_map or f['similarity_score'] > file_map[display_name]['similarity_score']:
+                                file_map[display_name] = f
                         
                         retrieved_files = list(file_map.values())
-                        logger.info(f"After deduplication: {len(retrieved_files)} files, unique names: {[f[1] for f in retrieved_files]}")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(
+                                "After deduplication: %d files, unique names: %s",
+                                len(retrieved_files), [f['display_name'] for f in retrieved_files]
+                            )
                     
                     if retrieved_files:
-                        completion_data['retrieved_files'] = [
-                            {
-                                'gemini_file_name': f[0],
-                                'display_name': f[1],
-                                'similarity_score': f[2]
-                            }
-                            for f in retrieved_files
-                        ]
+                        completion_data['retrieved_files'] = retrieved_files
+                    
+                    await send_ws_message(websocket, completion_data)
                     
-                    await websocket.send_json(completion_data)
+                    # A stream cut short by an error is not cached
+                    if not stream_failed:
+                        response_cache.put(cache_scope, message, completion_data, query_embedding)
+                        if shared_version is not None:
+                            await shared_cache.put(cache_scope, message, completion_data, shared_version)
                     
-                    # Log successful query
+                    # Log successful query (written in the background)
                     try:
-                        doc_service.log_query(
+                        query_log_writer.submit(
                             query=message,
                             model_used=model,
                             success=True,
@@ -384,20 +754,21 @@ async def websocket_chat(
                             response_length=len(full_response),
                             prompt_tokens=prompt_tokens,
                             completion_tokens=completion_tokens,
-                            total_tokens=total_tokens
+                            total_tokens=total_tokens,
+                            context_cache_hit=context_cache_hit
                         )
                     except Exception as log_error:
                         logger.warning(f"Failed to log query: {log_error}")
                     
             except ValueError as ve:
-                await websocket.send_json({
+                await send_ws_message(websocket, {
                     'type': 'error',
                     'message': str(ve)
                 })
                 logger.error(f"Error in WebSocket: {ve}")
             except Exception as e:
                 logger.error(f"Unexpected error in WebSocket: {e}", exc_info=True)
-                await websocket.send_json({
+                await send_ws_message(websocket, {
                     'type': 'error',
                     'message': f'Error occurred: {str(e)}'
                 })
@@ -410,5 +781,3 @@ async def websocket_chat(
             await websocket.close()
         except:
             pass
-    finally:
-        db.close()
@@ -0,0 +1,25 @@
+from fastapi import Depends, Request
+from sqlalchemy.orm import Session
+from backend.services.rag_service import RAGService
+from backend.services.embedding_service import EmbeddingService
+from backend.services.document_service import DocumentService
+from backend.database.connection import get_db
+
+
+# Dependency functions shared by all routers
+def get_rag_service(request: Request) -> RAGService:
+    """Get shared RAG service instance"""
+    return request.app.state.rag_service
+
+
+def get_embedding_service(request: Request) -> EmbeddingService:
+    """Get shared embedding service instance"""
+    return request.app.state.embedding_service
+
+
+def get_document_service(
+    db: Session = Depends(get_db),
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+) -> DocumentService:
+    """Get document service instance"""
+    return DocumentService(db, embedding_service)
@@ -1,44 +1,124 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
 from backend.models.schemas import FileListResponse, FileInfo, UploadResponse, DeleteResponse
 from backend.services.rag_service import RAGService
-from backend.services.embedding_service import EmbeddingService
 from backend.services.document_service import DocumentService
-from backend.database.connection import get_db
-from backend.config import get_settings, Settings
+from backend.services.response_cache import response_cache
+from backend.routers.dependencies import get_rag_service, get_document_service
+from backend.config import UPLOAD_CHUNK_SIZE, FILE_CACHE_DIR
 from backend.utils.logger import get_logger
+from typing import BinaryIO, List, Tuple
+import asyncio
 import os
+import shutil
 import tempfile
-import io
 from PyPDF2 import PdfReader
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 logger = get_logger(__name__)
 
 
-# Dependency functions
-def get_rag_service(settings: Settings = Depends(get_settings)) -> RAGService:
-    """Get RAG service instance"""
-    return RAGService(settings.GOOGLE_API_KEY)
+async def invalidate_response_caches(request: Request) -> None:
+    """Drop cached chat responses locally and, if configured, on every worker"""
+    shared_cache = request.app.state.shared_response_cache
+    if shared_cache is not None:
+        await shared_cache.invalidate()
+    else:
+        response_cache.invalidate()
 
 
-def get_embedding_service(settings: Settings = Depends(get_settings)) -> EmbeddingService:
-    """Get embedding service instance"""
-    return EmbeddingService(settings.GOOGLE_API_KEY)
+def copy_to_temp_file(source: BinaryIO, suffix: str) -> Tuple[str, int]:
+    """
+    Copy a file object to a new temp file in fixed-size chunks
+    
+    Args:
+        source: Readable binary file object
+        suffix: Temp file suffix (keeps the extension for parsers)
+        
+    Returns:
+        Tuple of (temp file path, size in bytes); the caller deletes the file
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        try:
+            shutil.copyfileobj(source, tmp_file, UPLOAD_CHUNK_SIZE)
+        except BaseException:
+            tmp_file.close()
+            os.unlink(tmp_file.name)
+            raise
+        return tmp_file.name, tmp_file.tell()
+
+
+async def save_upload(file: UploadFile) -> Tuple[str, int]:
+    """
+    Spool an upload to a temp file without blocking the event loop
+    
+    Args:
+        file: Uploaded file
+        
+    Returns:
+        Tuple of (temp file path, size in bytes); the caller deletes the file
+    """
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    # One worker thread does the whole copy rather than a hop per chunk
+    await file.seek(0)
+    return await asyncio.to_thread(copy_to_temp_file, file.file, file_ext)
+
+
+def remove_files(paths: List[str]) -> None:
+    """Delete temp files, ignoring ones already gone"""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
 
+def extract_text(filename: str, path: str) -> str:
+    """
+    Extract indexable text from an uploaded file
+    
+    Args:
+        filename: Original file name (extension selects the parser)
+        path: Path of the saved upload
+        
+    Returns:
+        Extracted text (PDF text, or UTF-8 decoded content)
+    """
+    file_ext = os.path.splitext(filename)[1].lower()
+    
+    if file_ext == '.pdf':
+        # Extract text from PDF
+        try:
+            pdf_reader = PdfReader(path)
+            content_text = ""
+            for page in pdf_reader.pages:
+                content_text += page.extract_text() + "\n"
+            logger.info(f"Extracted {len(content_text)} characters from PDF: {filename}")
+            return content_text
+        except Exception as pdf_error:
+            logger.warning(f"Failed to extract PDF text, falling back to raw decode: {pdf_error}")
+    
+    # For .txt and other files, decode as UTF-8
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
 
-def get_document_service(
-    db: Session = Depends(get_db),
-    embedding_service: EmbeddingService = Depends(get_embedding_service)
-) -> DocumentService:
-    """Get document service instance"""
-    return DocumentService(db, embedding_service)
+
+def cache_file_content(gemini_file_name: str, display_name: str, content_text: str) -> None:
+    """Save extracted text so the file can be re-indexed by a later sync"""
+    cache_file_path = os.path.join(FILE_CACHE_DIR, f"{gemini_file_name}.txt")
+    try:
+        # Gemini names look like "files/<id>", so the parent directory is nested
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        with open(cache_file_path, 'w', encoding='utf-8') as cache_file:
+            cache_file.write(content_text)
+        logger.info(f"Cached content for {display_name}")
+    except Exception as cache_error:
+        logger.warning(f"Failed to cache file content: {cache_error}")
 
 
 @router.get("", response_model=FileListResponse)
 async def list_files(rag_service: RAGService = Depends(get_rag_service)):
     """List all uploaded files"""
-    files = rag_service.list_files()
+    files = await asyncio.to_thread(rag_service.list_files)
     return FileListResponse(
         files=[FileInfo(**f) for f in files],
         count=len(files)
@@ -47,62 +127,40 @@ async def list_files(rag_service: RAGService = Depends(get_rag_service)):
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
     rag_service: RAGService = Depends(get_rag_service),
     doc_service: DocumentService = Depends(get_document_service)
 ):
     """Upload a file to RAG system and index it"""
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Extract text based on file type
-        file_ext = os.path.splitext(file.filename)[1].lower()
-        
-        if file_ext == '.pdf':
-            # Extract text from PDF
-            try:
-                pdf_reader = PdfReader(io.BytesIO(content))
-                content_text = ""
-                for page in pdf_reader.pages:
-                    content_text += page.extract_text() + "\n"
-                logger.info(f"Extracted {len(content_text)} characters from PDF: {file.filename}")
-            except Exception as pdf_error:
-                logger.warning(f"Failed to extract PDF text, falling back to raw decode: {pdf_error}")
-                content_text = content.decode('utf-8', errors='ignore')
-        else:
-            # For .txt and other files, decode as UTF-8
-            content_text = content.decode('utf-8', errors='ignore')
-        
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-        
-        # Upload to Gemini
-        result = rag_service.upload_file(tmp_file_path, display_name=file.filename)
+        # Spool the upload to disk without holding it in memory
+        tmp_file_path, file_size = await save_upload(file)
+        try:
+            # Extract text based on file type
+            content_text = await asyncio.to_thread(extract_text, file.filename, tmp_file_path)
+            
+            # Upload to Gemini (blocking calls run in worker threads)
+            result = await asyncio.to_thread(
+                rag_service.upload_file, tmp_file_path, display_name=file.filename
+            )
+        finally:
+            await asyncio.to_thread(os.unlink, tmp_file_path)
         
         # Index document in database with embedding
-        doc_service.create_document(
+        await asyncio.to_thread(
+            doc_service.create_document,
             gemini_file_name=result['name'],
             display_name=result['display_name'],
             content=content_text,
-            file_size=len(content)
+            file_size=file_size
         )
         
         # Save content to cache for future sync
-        cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.file_cache')
-        os.makedirs(cache_dir, exist_ok=True)
-        cache_file_path = os.path.join(cache_dir, f"{result['name']}.txt")
-        try:
-            with open(cache_file_path, 'w', encoding='utf-8') as cache_file:
-                cache_file.write(content_text)
-            logger.info(f"Cached content for {file.filename}")
-        except Exception as cache_error:
-            logger.warning(f"Failed to cache file content: {cache_error}")
+        await asyncio.to_thread(cache_file_content, result['name'], file.filename, content_text)
         
-        # Clean up temp file
-        os.unlink(tmp_file_path)
+        # Cached chat responses may no longer reflect the document set
+        await invalidate_response_caches(request)
         
         return UploadResponse(
             success=True,
@@ -113,24 +171,112 @@ async def upload_file(
         logger.error(f"Error uploading file: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/upload_batch", response_model=dict)
+async def upload_files_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    rag_service: RAGService = Depends(get_rag_service),
+    doc_service: DocumentService = Depends(get_document_service)
+):
+    """
+    Upload several files and index them with batched embedding calls
+    
+    A file that fails to save, parse or upload is reported under "failed" and
+    the rest of the batch goes through. If indexing the batch fails, its
+    Gemini uploads are deleted again so no file is left without a document.
+    """
+    saved = await asyncio.gather(*(save_upload(file) for file in files), return_exceptions=True)
+    
+    uploaded = []
+    documents = []
+    failed = []
+    try:
+        for file, saved_file in zip(files, saved):
+            if isinstance(saved_file, BaseException):
+                if not isinstance(saved_file, Exception):
+                    raise saved_file
+                logger.error(f"Error saving upload {file.filename}: {saved_file}")
+                failed.append({"filename": file.filename, "error": str(saved_file)})
+                continue
+            tmp_file_path, file_size = saved_file
+            try:
+                content_text = await asyncio.to_thread(extract_text, file.filename, tmp_file_path)
+                result = await asyncio.to_thread(
+                    rag_service.upload_file, tmp_file_path, display_name=file.filename
+                )
+            except Exception as e:
+                logger.error(f"Error uploading file {file.filename}: {e}", exc_info=True)
+                failed.append({"filename": file.filename, "error": str(e)})
+                continue
+            uploaded.append(FileInfo(**result))
+            documents.append({
+                'gemini_file_name': result['name'],
+                'display_name': result['display_name'],
+                'content': content_text,
+                'file_size': file_size
+            })
+    finally:
+        await asyncio.to_thread(remove_files, [
+            saved_file[0] for saved_file in saved
+            if not isinstance(saved_file, BaseException)
+        ])
+    
+    indexed = 0
+    if documents:
+        try:
+            # One embedding call per EMBEDDING_DOC_BATCH_SIZE documents and a single INSERT
+            indexed = await asyncio.to_thread(doc_service.bulk_create_documents, documents)
+        except Exception as e:
+            logger.error(f"Error indexing uploaded files: {e}", exc_info=True)
+            uploaded_names = [document['gemini_file_name'] for document in documents]
+            deleted = await asyncio.to_thread(rag_service.batch_delete_files, uploaded_names)
+            if deleted < len(uploaded_names):
+                logger.warning(f"Rolled back {deleted}/{len(uploaded_names)} unindexed uploads")
+            # A partial rollback can still have changed the document set
+            await invalidate_response_caches(request)
+            raise HTTPException(status_code=500, detail=f"Failed to index uploaded files: {e}")
+        
+        # Save content to cache for future sync
+        for document in documents:
+            await asyncio.to_thread(
+                cache_file_content,
+                document['gemini_file_name'], document['display_name'], document['content']
+            )
+        
+        # Cached chat responses may no longer reflect the document set
+        await invalidate_response_caches(request)
+    
+    return {
+        "success": not failed,
+        "message": f"Uploaded {len(uploaded)} of {len(files)} files",
+        "files": uploaded,
+        "indexed": indexed,
+        "failed": failed
+    }
+
+
 @router.delete("/{file_name}", response_model=DeleteResponse)
 async def delete_file(
     file_name: str,
+    request: Request,
     rag_service: RAGService = Depends(get_rag_service),
     doc_service: DocumentService = Depends(get_document_service)
 ):
-    """Delete a file from RAG system and database"""
+    """Delete a file from the RAG system, then its database record"""
     try:
-        # Delete from Gemini
-        success = rag_service.delete_file(file_name)
+        # Gemini first, and a failure is reported: a file left in Gemini would be
+        # re-indexed by /sync after the client was told it is gone
+        deleted = await asyncio.to_thread(rag_service.delete_file, file_name)
+        if not deleted and await asyncio.to_thread(rag_service.file_exists, file_name):
+            raise HTTPException(status_code=502, detail="Failed to delete file from Gemini")
         
-        # Delete from database
-        doc_service.delete_document(file_name)
-        
-        if success:
-            return DeleteResponse(success=True, message="File deleted successfully")
-        else:
+        indexed = await asyncio.to_thread(doc_service.delete_document, file_name)
+        if not deleted and not indexed:
             raise HTTPException(status_code=404, detail="找不到指定的檔案")
+        
+        await invalidate_response_caches(request)
+        
+        return DeleteResponse(success=True, message="File deleted successfully")
     except HTTPException:
         raise
     except Exception as e:
@@ -138,10 +284,14 @@ async def delete_file(
 
 
 @router.delete("", response_model=DeleteResponse)
-async def clear_all_files(rag_service: RAGService = Depends(get_rag_service)):
+async def clear_all_files(
+    request: Request,
+    rag_service: RAGService = Depends(get_rag_service)
+):
     """Clear all uploaded files"""
     try:
-        count = rag_service.clear_all_files()
+        count = await asyncio.to_thread(rag_service.clear_all_files)
+        await invalidate_response_caches(request)
         return DeleteResponse(
             success=True,
             message=f"Deleted {count} files"
@@ -153,16 +303,19 @@ async def clear_all_files(rag_service: RAGService = Depends(get_rag_service)):
 
 @router.post("/sync", response_model=dict)
 async def sync_files(
+    request: Request,
     rag_service: RAGService = Depends(get_rag_service),
     doc_service: DocumentService = Depends(get_document_service)
 ):
     """Sync files from Gemini API to PostgreSQL database"""
     try:
         # Get all files from Gemini
-        gemini_files = rag_service.list_files()
+        gemini_files = await asyncio.to_thread(rag_service.list_files)
         
         # Use document service to sync files
-        synced_count = doc_service.sync_gemini_files_to_db(gemini_files)
+        synced_count = await asyncio.to_thread(doc_service.sync_gemini_files_to_db, gemini_files)
+        if synced_count:
+            await invalidate_response_caches(request)
         
         return {
             "success": True,
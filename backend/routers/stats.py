@@ -1,48 +1,91 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from backend.models.schemas import StatsResponse, QueryHistoryResponse
 from backend.services.embedding_service import EmbeddingService
 from backend.services.document_service import DocumentService
-from backend.database.connection import get_db
-from backend.config import get_settings, Settings
+from backend.routers.dependencies import get_embedding_service, get_document_service
+from typing import Optional, Tuple
+import asyncio
+import base64
+import binascii
 
 router = APIRouter(prefix="/api/stats", tags=["statistics"])
 
 
-# Dependency functions
-def get_embedding_service(settings: Settings = Depends(get_settings)) -> EmbeddingService:
-    """Get embedding service instance"""
-    return EmbeddingService(settings.GOOGLE_API_KEY)
+@router.get("", response_model=StatsResponse)
+async def get_statistics(doc_service: DocumentService = Depends(get_document_service)):
+    """
+    Get usage statistics
+    
+    Returns query counts, model usage, and other metrics
+    """
+    return await asyncio.to_thread(doc_service.get_query_stats)
 
 
-def get_document_service(
-    db: Session = Depends(get_db),
+@router.get("/embedding-cache", response_model=dict)
+async def get_embedding_cache_stats(
     embedding_service: EmbeddingService = Depends(get_embedding_service)
-) -> DocumentService:
-    """Get document service instance"""
-    return DocumentService(db, embedding_service)
+):
+    """
+    Get persistent document-embedding cache counters
+    
+    Hits are document embeddings loaded from the database instead of the API
+    """
+    store = embedding_service.store
+    stats = store.stats() if store is not None else {'hits': 0, 'misses': 0}
+    return {'embedding_cache_hits': stats['hits'], 'embedding_cache_misses': stats['misses']}
 
 
-@router.get("", response_model=StatsResponse)
-async def get_statistics(doc_service: DocumentService = Depends(get_document_service)):
+def encode_history_cursor(last_id: int, total: int) -> str:
+    """Opaque cursor pointing after the given query log id, carrying the history total"""
+    return base64.urlsafe_b64encode(f"{last_id}:{total}".encode()).decode()
+
+
+def decode_history_cursor(cursor: str) -> Tuple[int, Optional[int]]:
     """
-    Get usage statistics
+    Decode a history cursor
     
-    Returns query counts, model usage, and other metrics
+    Returns:
+        Tuple of (last log id, history total from the first page; None for
+        cursors issued before the total was carried)
+    
+    Raises:
+        HTTPException: If the cursor is malformed
     """
-    return doc_service.get_query_stats()
+    try:
+        last_id, _, total = base64.urlsafe_b64decode(cursor.encode()).decode().partition(':')
+        return int(last_id), int(total) if total else None
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/history", response_model=QueryHistoryResponse)
 async def get_query_history(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(50, ge=1, le=100, description="Items per page"),
     order: str = Query('desc', regex='^(asc|desc)$', description="Sort order"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page (overrides page)"),
     doc_service: DocumentService = Depends(get_document_service)
 ):
     """
     Get query history with pagination
     
-    Returns list of previous queries with token usage details
+    Returns list of previous queries with token usage details. Full pages set
+    an X-Next-Cursor header; passing it back as `cursor` fetches the next page
+    with keyset pagination, which costs the same at any depth. Cursor pages
+    report the total counted for the first page instead of recounting.
     """
-    return doc_service.get_query_history(page=page, page_size=page_size, order_by=order)
+    after_id, total = decode_history_cursor(cursor) if cursor else (None, None)
+    result = await asyncio.to_thread(
+        doc_service.get_query_history,
+        page=page,
+        page_size=page_size,
+        order_by=order,
+        after_id=after_id,
+        total=total
+    )
+    if len(result.history) == page_size:
+        last = result.history[-1]
+        last_id = last['id'] if isinstance(last, dict) else last.id
+        response.headers['X-Next-Cursor'] = encode_history_cursor(last_id, result.total)
+    return result
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Production server entrypoint: multi-worker uvicorn with uvloop and httptools
+
+Usage: python -m backend.serve
+Worker count defaults to the number of CPU cores (override with WEB_CONCURRENCY).
+"""
+
+import os
+import uvicorn
+
+
+def main():
+    workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+
+    # Each worker runs the app lifespan and owns its services and caches
+    uvicorn.run(
+        "backend.main:app",
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '8000')),
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        lifespan="on"
+    )
+
+
+if __name__ == "__main__":
+    main()
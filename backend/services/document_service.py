@@ -1,21 +1,54 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
-from typing import List, Optional, Tuple, Any
-from backend.database.models import Document, QueryLog
-from backend.services.embedding_service import EmbeddingService
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Optional, Sequence, Tuple, Any, Dict
+from backend.database.models import Document, QueryLog, make_content_preview
+from backend.services.embedding_service import EmbeddingService, normalize_embedding
 from backend.models.schemas import StatsResponse, QueryHistoryResponse
 from backend.exceptions import DatabaseError, EmbeddingError
 from backend.utils.logger import get_logger
-from backend.config import CONTENT_PREVIEW_LENGTH
+from backend.config import (
+    CONTENT_PREVIEW_LENGTH,
+    FILE_CACHE_DIR,
+    FILE_CACHE_READ_CONCURRENCY,
+    HNSW_EF_SEARCH_PER_RESULT,
+    HNSW_EF_SEARCH_MIN,
+    HNSW_EF_SEARCH_MAX
+)
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+
+# Columns returned by query history, loaded as plain rows instead of ORM entities
+HISTORY_COLUMNS = (
+    QueryLog.id,
+    QueryLog.query,
+    QueryLog.model_used,
+    QueryLog.files_used,
+    QueryLog.selected_files,
+    QueryLog.system_prompt_used,
+    QueryLog.response_length,
+    QueryLog.prompt_tokens,
+    QueryLog.completion_tokens,
+    QueryLog.total_tokens,
+    QueryLog.context_cache_hit,
+    QueryLog.success,
+    QueryLog.error_message,
+    QueryLog.created_at,
+)
 
 
 class DocumentService:
     """Service for managing documents with embeddings"""
     
+    # Constructed per request (it wraps the request's session), so setup is
+    # kept to attribute assignment; shared state lives on the services passed in
+    __slots__ = ('db', 'embedding_service')
+    logger = get_logger(__name__)
+    
     def __init__(self, db: Session, embedding_service: EmbeddingService):
         self.db = db
         self.embedding_service = embedding_service
-        self.logger = get_logger(__name__)
     
     def create_document(
         self,
@@ -23,9 +56,9 @@ class DocumentService:
         display_name: str,
         content: str,
         file_size: Optional[int] = None
-    ) -> Document:
+    ) -> int:
         """
-        Create a new document with embedding
+        Create a document with embedding, or update it if already indexed
         
         Args:
             gemini_file_name: Unique file name from Gemini API
@@ -34,40 +67,42 @@ class DocumentService:
             file_size: File size in bytes
             
         Returns:
-            Created document
+            ID of the created or updated document
             
         Raises:
             DatabaseError: If document creation fails
             EmbeddingError: If embedding generation fails
         """
         try:
-            # Check if document already exists
-            existing = self.db.query(Document).filter(
-                Document.gemini_file_name == gemini_file_name
-            ).first()
-            
-            if existing:
-                self.logger.info(f"Document {display_name} already exists, updating...")
-                return self.update_document(existing.id, content)
-            
             # Generate embedding (will raise EmbeddingError if fails)
-            embedding = self.embedding_service.generate_embedding(content)
+            embedding = normalize_embedding(self.embedding_service.generate_embedding(content))
             
-            # Create document
-            document = Document(
+            # Insert, or refresh the content of an already indexed file, in one
+            # statement (no existence check round trip, no check-then-insert race)
+            stmt = insert(Document).values(
                 gemini_file_name=gemini_file_name,
                 display_name=display_name,
                 content=content,
+                stored_preview=make_content_preview(content),
                 embedding=embedding,
                 file_size=file_size or len(content)
             )
-            
-            self.db.add(document)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['gemini_file_name'],
+                set_={
+                    'content': stmt.excluded.content,
+                    'content_preview': stmt.excluded.content_preview,
+                    'embedding': stmt.excluded.embedding,
+                    'file_size': stmt.excluded.file_size,
+                    'updated_at': func.now()
+                }
+            ).returning(Document.id)
+            # Only the id comes back, not the content and embedding just written
+            document_id = self.db.execute(stmt).scalar_one()
             self.db.commit()
-            self.db.refresh(document)
             
             self.logger.info(f"Document {display_name} indexed with embedding")
-            return document
+            return document_id
         
         except EmbeddingError:
             self.db.rollback()
@@ -77,6 +112,75 @@ class DocumentService:
             self.logger.error(f"Error creating document {display_name}: {e}", exc_info=True)
             raise DatabaseError(f"Failed to create document: {e}")
     
+    def bulk_create_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Create multiple documents with embeddings in a single INSERT
+        
+        Args:
+            documents: List of dicts with gemini_file_name, display_name,
+                content and optional file_size
+            
+        Returns:
+            Number of documents created
+            
+        Raises:
+            DatabaseError: If document creation fails
+            EmbeddingError: If embedding generation fails
+        """
+        if not documents:
+            return 0
+        
+        try:
+            # Skip documents that are already indexed
+            names = [doc['gemini_file_name'] for doc in documents]
+            existing = {
+                name for (name,) in self.db.query(Document.gemini_file_name).filter(
+                    Document.gemini_file_name.in_(names)
+                )
+            }
+            new_documents = [doc for doc in documents if doc['gemini_file_name'] not in existing]
+            if not new_documents:
+                return 0
+            
+            # Generate embeddings (will raise EmbeddingError if fails)
+            embeddings = self.embedding_service.batch_generate_embeddings(
+                [doc['content'] for doc in new_documents]
+            )
+            
+            rows = [
+                {
+                    'gemini_file_name': doc['gemini_file_name'],
+                    'display_name': doc['display_name'],
+                    'content': doc['content'],
+                    'stored_preview': make_content_preview(doc['content']),
+                    'embedding': normalize_embedding(embedding),
+                    'file_size': doc.get('file_size') or len(doc['content'])
+                }
+                for doc, embedding in zip(new_documents, embeddings)
+            ]
+            
+            # A concurrent sync may have indexed some of these since the check above;
+            # RETURNING yields only the rows actually inserted
+            result = self.db.execute(
+                insert(Document)
+                .on_conflict_do_nothing(index_elements=['gemini_file_name'])
+                .returning(Document.id),
+                rows
+            )
+            created = len(result.all())
+            self.db.commit()
+            
+            self.logger.info(f"Indexed {created} documents with embeddings")
+            return created
+        
+        except EmbeddingError:
+            self.db.rollback()
+            raise
+        except Exception as e:
+            self.db.rollback()
+            self.logger.error(f"Error bulk creating documents: {e}", exc_info=True)
+            raise DatabaseError(f"Failed to create documents: {e}")
+    
     def update_document(self, document_id: int, content: str) -> Document:
         """
         Update document content and regenerate embedding
@@ -92,16 +196,19 @@ class DocumentService:
                 raise DatabaseError(f"Document with id {document_id} not found")
             
             # Generate new embedding (will raise EmbeddingError if fails)
-            embedding = self.embedding_service.generate_embedding(content)
+            embedding = normalize_embedding(self.embedding_service.generate_embedding(content))
             
             document.content = content
+            document.stored_preview = make_content_preview(content)
             document.embedding = embedding
             document.file_size = len(content)
+            display_name = document.display_name
             
+            # No refresh: every written value is known, and commit expires the
+            # instance so anything server-generated loads only if it is read
             self.db.commit()
-            self.db.refresh(document)
             
-            self.logger.info(f"Updated document {document.display_name}")
+            self.logger.info(f"Updated document {display_name}")
             return document
         
         except (DatabaseError, EmbeddingError):
@@ -154,7 +261,8 @@ class DocumentService:
         self,
         query: str,
         top_k: Optional[int] = 5,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[Sequence[float]] = None
     ) -> List[Tuple[Document, float]]:
         """
         Search for documents similar to query using vector similarity
@@ -163,6 +271,7 @@ class DocumentService:
             query: Search query text
             top_k: Number of top results to return
             similarity_threshold: Minimum similarity score (0-1)
+            query_embedding: Precomputed query embedding (generated if None)
             
         Returns:
             List of (document, similarity_score) tuples
@@ -173,17 +282,40 @@ class DocumentService:
         """
         try:
             # Generate query embedding (will raise EmbeddingError if fails)
-            query_embedding = self.embedding_service.generate_query_embedding(query)
+            if query_embedding is None:
+                query_embedding = self.embedding_service.generate_query_embedding(query)
+            
+            # HNSW returns at most ef_search candidates, so size the candidate list
+            # to the request: small top_k finishes in fewer graph hops, large
+            # top_k keeps its recall. The threshold is applied to these
+            # candidates and does not change how many are needed. Set for this
+            # transaction only.
+            ef_search = self.ef_search_for(top_k)
+            self.db.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                {'ef': str(ef_search)}
+            )
             
             # Perform vector similarity search using pgvector
-            # Using cosine distance (1 - cosine similarity)
+            # Stored embeddings are unit length, so with a normalized query the
+            # negative inner product (<#>) is -cosine similarity and skips the
+            # per-candidate norms of <=>. Order by it ascending so the HNSW index
+            # serves the ORDER BY ... LIMIT (ordering by similarity would force a
+            # full scan). The distance is selected once and ordered by its alias;
+            # similarity is derived from it here.
+            distance = Document.embedding.max_inner_product(normalize_embedding(query_embedding))
+            distance_column = distance.label('distance')
+            conditions = [Document.embedding.isnot(None)]
+            if similarity_threshold > 0:
+                # Threshold as a distance bound so rejected rows never leave the database
+                conditions.append(distance <= -similarity_threshold)
             query_builder = self.db.query(
                 Document,
-                (1 - Document.embedding.cosine_distance(query_embedding)).label('similarity')
+                distance_column
             ).filter(
-                Document.embedding.isnot(None)
+                *conditions
             ).order_by(
-                text('similarity DESC')
+                distance_column
             )
             
             # Apply limit only if top_k is specified (not None)
@@ -193,17 +325,9 @@ class DocumentService:
                 # No limit - return all matching documents
                 results = query_builder.all()
             
-            # Filter by similarity threshold (if threshold > 0, otherwise return all)
-            if similarity_threshold > 0:
-                filtered_results = [
-                    (doc, float(sim)) for doc, sim in results 
-                    if float(sim) >= similarity_threshold
-                ]
-            else:
-                # No filtering - return all results sorted by similarity
-                filtered_results = [(doc, float(sim)) for doc, sim in results]
+            filtered_results = [(doc, -float(dist)) for doc, dist in results]
             
-            self.logger.info(f"Search found {len(filtered_results)} results for query (threshold: {similarity_threshold})")
+            self.logger.debug("Search found %d results for query (threshold: %s)", len(filtered_results), similarity_threshold)
             return filtered_results
         
         except EmbeddingError:
@@ -212,6 +336,13 @@ class DocumentService:
             self.logger.error(f"Error searching documents: {e}", exc_info=True)
             raise DatabaseError(f"Failed to search documents: {e}")
     
+    @staticmethod
+    def ef_search_for(top_k: Optional[int]) -> int:
+        """HNSW candidate list size for a search returning top_k results"""
+        if top_k is None:
+            return HNSW_EF_SEARCH_MAX
+        return min(max(top_k * HNSW_EF_SEARCH_PER_RESULT, HNSW_EF_SEARCH_MIN), HNSW_EF_SEARCH_MAX)
+    
     def log_query(
         self,
         query: str,
@@ -224,7 +355,8 @@ class DocumentService:
         completion_tokens: Optional[int] = None,
         total_tokens: Optional[int] = None,
         success: bool = True,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        context_cache_hit: Optional[bool] = None
     ) -> QueryLog:
         """
         Log a query for usage statistics
@@ -244,12 +376,13 @@ class DocumentService:
                 completion_tokens=completion_tokens,
                 total_tokens=total_tokens,
                 success=success,
-                error_message=error_message
+                error_message=error_message,
+                context_cache_hit=context_cache_hit
             )
             
+            # The INSERT returns the generated id; no refresh SELECT needed
             self.db.add(log)
             self.db.commit()
-            self.db.refresh(log)
             
             return log
         
@@ -269,39 +402,38 @@ class DocumentService:
             DatabaseError: If stats retrieval fails
         """
         try:
-            total_queries = self.db.query(func.count(QueryLog.id)).scalar()
-            
-            # Model usage stats
+            # One grouped scan; overall totals are summed from the per-model rows.
+            # Averages are rebuilt from sums and non-null counts to match AVG().
             model_stats = self.db.query(
                 QueryLog.model_used,
-                func.count(QueryLog.id).label('count')
+                # count(*) rather than count(id) keeps the scan index-only (ix_qlog_stats)
+                func.count(),
+                func.count().filter(QueryLog.success == True),
+                func.sum(QueryLog.files_used),
+                func.count(QueryLog.files_used),
+                func.sum(QueryLog.total_tokens),
+                func.count(QueryLog.total_tokens)
             ).group_by(QueryLog.model_used).all()
             
-            # Success rate
-            successful = self.db.query(func.count(QueryLog.id)).filter(
-                QueryLog.success == True
-            ).scalar()
-            
-            # Average files used
-            avg_files = self.db.query(func.avg(QueryLog.files_used)).scalar()
-            
-            # Token usage stats (only count queries with token data)
-            total_tokens = self.db.query(func.sum(QueryLog.total_tokens)).filter(
-                QueryLog.total_tokens.isnot(None)
-            ).scalar()
-            
-            avg_tokens = self.db.query(func.avg(QueryLog.total_tokens)).filter(
-                QueryLog.total_tokens.isnot(None)
-            ).scalar()
+            total_queries = successful = files_sum = files_count = tokens_sum = tokens_count = 0
+            model_usage = {}
+            for model, count, ok, files, files_rows, tokens, tokens_rows in model_stats:
+                model_usage[model] = count
+                total_queries += count
+                successful += ok
+                files_sum += files or 0
+                files_count += files_rows
+                tokens_sum += tokens or 0
+                tokens_count += tokens_rows
             
             return StatsResponse(
-                total_queries=total_queries or 0,
-                successful_queries=successful or 0,
+                total_queries=total_queries,
+                successful_queries=successful,
                 success_rate=(successful / total_queries * 100) if total_queries > 0 else 0,
-                model_usage={model: count for model, count in model_stats},
-                avg_files_used=float(avg_files) if avg_files else 0,
-                total_tokens_used=int(total_tokens) if total_tokens else 0,
-                avg_tokens_per_query=float(avg_tokens) if avg_tokens else 0
+                model_usage=model_usage,
+                avg_files_used=float(files_sum / files_count) if files_count else 0,
+                total_tokens_used=int(tokens_sum),
+                avg_tokens_per_query=float(tokens_sum / tokens_count) if tokens_count else 0
             )
         
         except Exception as e:
@@ -312,11 +444,22 @@ class DocumentService:
         self,
         page: int = 1,
         page_size: int = 50,
-        order_by: str = 'desc'
+        order_by: str = 'desc',
+        after_id: Optional[int] = None,
+        total: Optional[int] = None
     ) -> QueryHistoryResponse:
         """
         Get query history with pagination
         
+        Args:
+            page: Page number (OFFSET pagination; ignored when after_id is given)
+            page_size: Items per page
+            order_by: 'desc' (newest first) or 'asc'
+            after_id: Keyset cursor - return entries after this log id in the
+                requested order, served from the primary key index at any depth
+            total: Total already counted for an earlier page; skips the
+                full-table count
+        
         Returns:
             QueryHistoryResponse with paginated history
             
@@ -324,23 +467,35 @@ class DocumentService:
             DatabaseError: If history retrieval fails
         """
         try:
-            offset = (page - 1) * page_size
-            
-            # Get total count
-            total = self.db.query(func.count(QueryLog.id)).scalar()
+            # Count once per listing; cursor pages pass the first page's total
+            if total is None:
+                total = self.db.query(func.count()).select_from(QueryLog).scalar()
             
-            # Get paginated history
-            query = self.db.query(QueryLog)
+            # Get paginated history as column rows (no ORM identity map/instrumentation)
+            query = self.db.query(*HISTORY_COLUMNS)
             
-            if order_by == 'desc':
-                query = query.order_by(QueryLog.created_at.desc())
+            if after_id is not None:
+                # Log ids increase with insertion time, so id order is time order
+                if order_by == 'desc':
+                    query = query.filter(QueryLog.id < after_id).order_by(QueryLog.id.desc())
+                else:
+                    query = query.filter(QueryLog.id > after_id).order_by(QueryLog.id.asc())
             else:
-                query = query.order_by(QueryLog.created_at.asc())
+                if order_by == 'desc':
+                    query = query.order_by(QueryLog.created_at.desc())
+                else:
+                    query = query.order_by(QueryLog.created_at.asc())
+                query = query.offset((page - 1) * page_size)
             
-            history = query.offset(offset).limit(page_size).all()
+            history = []
+            for row in query.limit(page_size).all():
+                item = dict(row._mapping)
+                created_at = item['created_at']
+                item['created_at'] = created_at.isoformat() if created_at else None
+                history.append(item)
             
             return QueryHistoryResponse(
-                history=[log.to_dict() for log in history],
+                history=history,
                 total=total or 0,
                 page=page,
                 page_size=page_size
@@ -354,65 +509,75 @@ class DocumentService:
         """
         Sync Gemini files to database
         
+        Files missing from the database are re-indexed from the content cache
+        with one batched embedding call and a single INSERT.
+        
         Args:
             gemini_files: List of Gemini file objects or dicts
             
         Returns:
             Number of files synced
         """
-        synced_count = 0
+        files = []
+        for file in gemini_files:
+            # Handle both dict and object formats
+            if isinstance(file, dict):
+                files.append((file.get('name'), file.get('display_name'), file.get('size_bytes', 0)))
+            else:
+                files.append((file.name, file.display_name, getattr(file, 'size_bytes', 0)))
         
-        # Get cache directory path
-        import os
-        cache_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            '.file_cache'
-        )
+        # Check which files are already indexed in one query
+        existing = {
+            name for (name,) in self.db.query(Document.gemini_file_name).filter(
+                Document.gemini_file_name.in_([file_name for file_name, _, _ in files])
+            )
+        }
         
-        for file in gemini_files:
-            try:
-                # Handle both dict and object formats
-                if isinstance(file, dict):
-                    file_name = file.get('name')
-                    display_name = file.get('display_name')
-                    file_size = file.get('size_bytes', 0)
-                else:
-                    file_name = file.name
-                    display_name = file.display_name
-                    file_size = getattr(file, 'size_bytes', 0)
-                
-                # Check if already indexed
-                existing = self.get_document_by_name(file_name)
-                if existing:
-                    self.logger.debug(f"File {display_name} already indexed, skipping")
-                    continue
-                
-                # Try to read from cache
-                cache_file_path = os.path.join(cache_dir, f"{file_name}.txt")
-                if os.path.exists(cache_file_path):
-                    try:
-                        with open(cache_file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                        
-                        # Create document with cached content
-                        self.create_document(
-                            gemini_file_name=file_name,
-                            display_name=display_name,
-                            content=content,
-                            file_size=file_size
-                        )
-                        synced_count += 1
-                        self.logger.info(f"Synced {display_name} from cache")
-                        continue
-                    except Exception as cache_error:
-                        self.logger.warning(f"Failed to read cache for {display_name}: {cache_error}")
-                
-                # Gemini API doesn't provide file content download
-                self.logger.warning(
-                    f"File {display_name} not indexed (content not available, no cache found)"
-                )
-                
-            except Exception as e:
-                self.logger.error(f"Error syncing file {display_name}: {e}")
+        missing = [file for file in files if file[0] not in existing]
+        if not missing:
+            return 0
         
+        # Cache reads are independent file I/O, so they overlap in a thread pool
+        workers = min(FILE_CACHE_READ_CONCURRENCY, len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            contents = list(executor.map(self._read_cached_content, missing))
+        
+        documents = [
+            {
+                'gemini_file_name': file_name,
+                'display_name': display_name,
+                'content': content,
+                'file_size': file_size
+            }
+            for (file_name, display_name, file_size), content in zip(missing, contents)
+            if content is not None
+        ]
+        if not documents:
+            return 0
+        
+        try:
+            synced_count = self.bulk_create_documents(documents)
+        except (DatabaseError, EmbeddingError) as e:
+            self.logger.error(f"Error syncing files: {e}")
+            return 0
+        
+        self.logger.info(f"Synced {synced_count} files from cache")
         return synced_count
+    
+    def _read_cached_content(self, file: Tuple[str, str, int]) -> Optional[str]:
+        """Read a file's cached content (None if unavailable)"""
+        file_name, display_name, _ = file
+        cache_file_path = os.path.join(FILE_CACHE_DIR, f"{file_name}.txt")
+        try:
+            with open(cache_file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+        except Exception as cache_error:
+            self.logger.warning(f"Failed to read cache for {display_name}: {cache_error}")
+        
+        # Gemini API doesn't provide file content download
+        self.logger.warning(
+            f"File {display_name} not indexed (content not available, no cache found)"
+        )
+        return None
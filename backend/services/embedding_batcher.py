@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import numpy as np
+from backend.config import EMBEDDING_BATCH_WINDOW, EMBEDDING_BATCH_MAX_SIZE
+from backend.services.embedding_service import EmbeddingService
+from backend.utils.logger import get_logger
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent query-embedding requests into batched API calls"""
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        max_batch: int = EMBEDDING_BATCH_MAX_SIZE,
+        window: float = EMBEDDING_BATCH_WINDOW
+    ):
+        """
+        Initialize embedding batcher
+
+        Args:
+            embedding_service: Service used to embed each batch
+            max_batch: Maximum number of queries per API call
+            window: Seconds to wait for more queries after the first arrives
+        """
+        self.embedding_service = embedding_service
+        self.max_batch = max_batch
+        self.window = window
+        self.logger = get_logger(__name__)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Latency percentiles cover the last 1000 successful batches; the
+        # counters cover every batch since startup
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._batches = 0
+        self._failed_batches = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a search query, batched with concurrent callers
+
+        Args:
+            text: Search query text
+
+        Returns:
+            Embedding vector
+
+        Raises:
+            EmbeddingError: If the batch embedding call fails
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Drain the queue in windows of up to max_batch queries"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            self._batches += 1
+            start = time.perf_counter()
+            try:
+                embeddings = await asyncio.to_thread(
+                    self.embedding_service.batch_generate_query_embeddings, texts
+                )
+            except Exception as e:
+                self._failed_batches += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._latencies.append((time.perf_counter() - start) * 1000)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+
+    def stats(self) -> Dict[str, float]:
+        """Get batch counts and p50/p99 batch embedding latency in milliseconds"""
+        stats = {'batches': self._batches, 'failed_batches': self._failed_batches}
+        if not self._latencies:
+            return {**stats, 'p50_ms': 0.0, 'p99_ms': 0.0}
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+        return {
+            **stats,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99))
+        }
+
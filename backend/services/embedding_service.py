@@ -1,20 +1,54 @@
 import google.generativeai as genai
-from typing import List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import hashlib
+import math
+import threading
 import numpy as np
-from backend.config import EMBEDDING_MODEL
+from cachetools import LRUCache
+from backend.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_DOC_BATCH_SIZE
+)
 from backend.exceptions import EmbeddingError
 from backend.utils.logger import get_logger
 
+if TYPE_CHECKING:
+    from backend.services.embedding_store import EmbeddingStore
+
+
+def normalize_embedding(vector: Sequence[float]) -> np.ndarray:
+    """
+    Scale an embedding to unit length
+    
+    Stored document vectors are unit length, so cosine similarity against
+    them reduces to a dot product.
+    
+    Args:
+        vector: Embedding vector
+        
+    Returns:
+        Unit-length float32 vector (zero vectors are returned unchanged)
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
 
 class EmbeddingService:
     """Service for generating and managing embeddings using Gemini API"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, store: Optional["EmbeddingStore"] = None):
         """
         Initialize embedding service
         
         Args:
             api_key: Google API key for authentication
+            store: Persistent document-embedding cache (documents are always
+                embedded via the API if None)
         """
         if not api_key:
             raise ValueError("API key is required")
@@ -23,34 +57,66 @@ class EmbeddingService:
         self.logger = get_logger(__name__)
         genai.configure(api_key=api_key)
         self.embedding_model = EMBEDDING_MODEL
+        self.store = store
+        
+        # API entry points with model and task type bound once
+        self._document_embedder = partial(
+            genai.embed_content, model=self.embedding_model, task_type="retrieval_document"
+        )
+        self._query_embedder = partial(
+            genai.embed_content, model=self.embedding_model, task_type="retrieval_query"
+        )
+        
+        # Query embeddings keyed by content hash; repeated queries skip the API call
+        self._cache: LRUCache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
         
         self.logger.info(f"EmbeddingService initialized with model: {self.embedding_model}")
     
-    def generate_embedding(self, text: str) -> List[float]:
+    def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate embedding vector for given text
         
+        Previously embedded content is loaded from the store instead.
+        
         Args:
             text: Text to embed
             
         Returns:
-            List of floats representing the embedding vector (768 dimensions)
+            float32 embedding vector (768 dimensions)
             
         Raises:
             EmbeddingError: If embedding generation fails
         """
+        if self.store is None:
+            return self._embed_document(text)
+        
+        content_hash = self.store.content_hash(text)
+        stored = self.store.get_many([content_hash]).get(content_hash)
+        if stored is not None:
+            return stored
+        
+        embedding = self._embed_document(text)
+        self.store.put_many({content_hash: embedding})
+        return embedding
+    
+    def _embed_document(self, text: str) -> np.ndarray:
+        """Embed a single document with the API"""
         try:
-            result = genai.embed_content(
-                model=self.embedding_model,
-                content=text,
-                task_type="retrieval_document"
-            )
-            return result['embedding']
+            result = self._document_embedder(content=text)
+            return np.asarray(result['embedding'], dtype=np.float32)
         except Exception as e:
             self.logger.error(f"Embedding generation error: {e}", exc_info=True)
             raise EmbeddingError(f"Failed to generate embedding: {e}")
     
-    def generate_query_embedding(self, query: str) -> List[float]:
+    def _cache_key(self, text: str) -> bytes:
+        """Hash model name and text so switching models never returns stale vectors"""
+        raw = f"{self.embedding_model}\0{text}".encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).digest()
+    
+    def generate_query_embedding(self, query: str) -> np.ndarray:
         """
         Generate embedding vector for search query
         
@@ -58,37 +124,147 @@ class EmbeddingService:
             query: Search query text
             
         Returns:
-            List of floats representing the embedding vector (768 dimensions)
+            float32 embedding vector (768 dimensions)
             
         Raises:
             EmbeddingError: If embedding generation fails
         """
+        key = self._cache_key(query)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache_hits += 1
+                return cached
+            self._cache_misses += 1
+        
         try:
-            result = genai.embed_content(
-                model=self.embedding_model,
-                content=query,
-                task_type="retrieval_query"
-            )
-            return result['embedding']
+            result = self._query_embedder(content=query)
         except Exception as e:
             self.logger.error(f"Query embedding generation error: {e}", exc_info=True)
             raise EmbeddingError(f"Failed to generate query embedding: {e}")
+        
+        embedding = np.asarray(result['embedding'], dtype=np.float32)
+        with self._cache_lock:
+            self._cache[key] = embedding
+        return embedding
+    
+    def batch_generate_query_embeddings(self, queries: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for multiple search queries in one API call
+        
+        Cached queries are served from memory; only the misses are sent.
+        
+        Args:
+            queries: Search query texts
+            
+        Returns:
+            List of embedding vectors, in input order
+            
+        Raises:
+            EmbeddingError: If embedding generation fails
+        """
+        keys = [self._cache_key(query) for query in queries]
+        with self._cache_lock:
+            embeddings = [self._cache.get(key) for key in keys]
+        
+        # Unique uncached texts, so duplicates within a batch are embedded once
+        missing = list(dict.fromkeys(
+            query for query, embedding in zip(queries, embeddings) if embedding is None
+        ))
+        with self._cache_lock:
+            self._cache_hits += len(queries) - len(missing)
+            self._cache_misses += len(missing)
+        
+        if missing:
+            try:
+                result = self._query_embedder(content=missing)
+            except Exception as e:
+                self.logger.error(f"Batch query embedding generation error: {e}", exc_info=True)
+                raise EmbeddingError(f"Failed to generate query embeddings: {e}")
+            
+            fetched = dict(zip(missing, np.asarray(result['embedding'], dtype=np.float32)))
+            with self._cache_lock:
+                for query, embedding in fetched.items():
+                    self._cache[self._cache_key(query)] = embedding
+            embeddings = [
+                embedding if embedding is not None else fetched[query]
+                for query, embedding in zip(queries, embeddings)
+            ]
+        
+        return embeddings
+    
+    def stats(self) -> Dict[str, int]:
+        """Get query embedding cache hit/miss counters"""
+        with self._cache_lock:
+            return {
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'size': len(self._cache)
+            }
+    
+    def _embed_document_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed a list of documents with a single API call"""
+        try:
+            result = self._document_embedder(content=texts)
+            return list(np.asarray(result['embedding'], dtype=np.float32))
+        except Exception as e:
+            self.logger.error(f"Batch embedding generation error: {e}", exc_info=True)
+            raise EmbeddingError(f"Failed to generate embeddings: {e}")
     
-    def batch_generate_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+    def batch_generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
         """
         Generate embeddings for multiple texts
         
+        Stored embeddings are reused; the remaining unique texts are sent
+        EMBEDDING_DOC_BATCH_SIZE per API call. The calls are issued concurrently
+        (bounded by EMBEDDING_CONCURRENCY) and results are returned in input order.
+        
         Args:
             texts: List of texts to embed
             
         Returns:
             List of embedding vectors
+            
+        Raises:
+            EmbeddingError: If any embedding generation fails
         """
-        embeddings = []
-        for text in texts:
-            embedding = self.generate_embedding(text)
-            embeddings.append(embedding)
-        return embeddings
+        if self.store is None:
+            return self._embed_documents(texts)
+        
+        hashes = [self.store.content_hash(text) for text in texts]
+        found = self.store.get_many(hashes)
+        
+        missing: Dict[bytes, str] = {}
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in found:
+                missing.setdefault(content_hash, text)
+        
+        if missing:
+            fetched = dict(zip(missing, self._embed_documents(list(missing.values()))))
+            self.store.put_many(fetched)
+            found.update(fetched)
+        
+        return [found[content_hash] for content_hash in hashes]
+    
+    def _embed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed documents with the API in concurrent batches, preserving order"""
+        if len(texts) <= 1:
+            return [self._embed_document(text) for text in texts]
+        
+        batches = [
+            texts[i:i + EMBEDDING_DOC_BATCH_SIZE]
+            for i in range(0, len(texts), EMBEDDING_DOC_BATCH_SIZE)
+        ]
+        if len(batches) == 1:
+            return self._embed_document_batch(batches[0])
+        
+        workers = min(EMBEDDING_CONCURRENCY, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [
+                embedding
+                for batch in executor.map(self._embed_document_batch, batches)
+                for embedding in batch
+            ]
     
     @staticmethod
     def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
@@ -102,14 +278,14 @@ class EmbeddingService:
         Returns:
             Cosine similarity score (0-1)
         """
-        v1 = np.array(vec1)
-        v2 = np.array(vec2)
-        
-        dot_product = np.dot(v1, v2)
-        norm1 = np.linalg.norm(v1)
-        norm2 = np.linalg.norm(v2)
+        v1 = np.asarray(vec1, dtype=np.float32)
+        v2 = np.asarray(vec2, dtype=np.float32)
         
-        if norm1 == 0 or norm2 == 0:
+        # Three dot products and one sqrt; for unit vectors (stored documents)
+        # np.dot(v1, v2) alone is the similarity
+        norms = float(np.dot(v1, v1)) * float(np.dot(v2, v2))
+        if norms == 0:
             return 0.0
         
-        return float(dot_product / (norm1 * norm2))
+        return float(np.dot(v1, v2)) / math.sqrt(norms)
+
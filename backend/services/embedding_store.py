@@ -0,0 +1,97 @@
+import hashlib
+import threading
+from typing import Dict, List, Sequence
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from backend.config import EMBEDDING_MODEL
+from backend.database.connection import get_db_context
+from backend.database.models import EmbeddingCache
+from backend.utils.logger import get_logger
+
+
+class EmbeddingStore:
+    """Persistent document-embedding cache keyed by content SHA-256"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL):
+        """
+        Initialize embedding store
+
+        Args:
+            model: Embedding model the stored vectors belong to
+        """
+        self.model = model
+        self.logger = get_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def content_hash(text: str) -> bytes:
+        """SHA-256 digest of the text"""
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get_many(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Load stored embeddings
+
+        Args:
+            hashes: Content hashes to look up (duplicates allowed)
+
+        Returns:
+            Mapping of hash to embedding for the hashes that were found;
+            empty if the lookup fails
+        """
+        try:
+            with get_db_context() as db:
+                rows = db.execute(
+                    select(EmbeddingCache.content_sha256, EmbeddingCache.vector).where(
+                        EmbeddingCache.model == self.model,
+                        EmbeddingCache.content_sha256.in_(list(set(hashes)))
+                    )
+                ).all()
+        except Exception as e:
+            self.logger.warning(f"Embedding store lookup failed: {e}")
+            rows = []
+
+        found = {
+            bytes(content_hash): np.frombuffer(vector, dtype=np.float32)
+            for content_hash, vector in rows
+        }
+        hits = sum(1 for content_hash in hashes if content_hash in found)
+        with self._lock:
+            self._hits += hits
+            self._misses += len(hashes) - hits
+        return found
+
+    def put_many(self, embeddings: Dict[bytes, Sequence[float]]) -> None:
+        """
+        Store embeddings (existing entries are kept)
+
+        Args:
+            embeddings: Mapping of content hash to embedding
+        """
+        if not embeddings:
+            return
+
+        rows = [
+            {
+                'content_sha256': content_hash,
+                'model': self.model,
+                'dim': len(embedding),
+                'vector': np.asarray(embedding, dtype=np.float32).tobytes()
+            }
+            for content_hash, embedding in embeddings.items()
+        ]
+        try:
+            with get_db_context() as db:
+                db.execute(insert(EmbeddingCache).on_conflict_do_nothing(), rows)
+                db.commit()
+        except Exception as e:
+            self.logger.warning(f"Embedding store write failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """Lookup counters since startup"""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses}
@@ -0,0 +1,120 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from backend.config import LSH_NUM_BITS, LSH_NUM_TABLES
+
+
+@lru_cache(maxsize=8)
+def random_hyperplanes(dim: int, num_planes: int, seed: int) -> np.ndarray:
+    """Read-only hyperplane matrix, shared by every index with the same parameters"""
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((num_planes, dim)).astype(np.float32)
+    planes.setflags(write=False)
+    return planes
+
+
+class LSHIndex:
+    """Random-projection LSH over vectors for approximate cosine lookup"""
+
+    def __init__(
+        self,
+        dim: int,
+        num_bits: int = LSH_NUM_BITS,
+        num_tables: int = LSH_NUM_TABLES,
+        seed: int = 0
+    ):
+        """
+        Initialize LSH index
+
+        Args:
+            dim: Vector dimension
+            num_bits: Hyperplanes (signature bits) per table
+            num_tables: Number of hash tables; more tables raise recall
+            seed: Seed for the random hyperplanes
+        """
+        self.dim = dim
+        self.num_bits = num_bits
+        self.num_tables = num_tables
+
+        self._planes = random_hyperplanes(dim, num_tables * num_bits, seed)
+        self._tables: List[Dict[bytes, Set[int]]] = [{} for _ in range(num_tables)]
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._keys: Dict[int, List[bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def _signatures(self, vector: np.ndarray) -> List[bytes]:
+        """Sign of the projection on each hyperplane, packed per table"""
+        bits = (self._planes @ vector > 0).reshape(self.num_tables, self.num_bits)
+        return [row.tobytes() for row in np.packbits(bits, axis=1)]
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def add(self, item_id: int, vector) -> bool:
+        """
+        Add a vector to the index
+
+        Args:
+            item_id: Caller-assigned identifier
+            vector: Vector to index
+
+        Returns:
+            False if the vector is all zeros and was not indexed
+        """
+        unit = self._normalize(vector)
+        if unit is None:
+            return False
+
+        keys = self._signatures(unit)
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, set()).add(item_id)
+        self._vectors[item_id] = unit
+        self._keys[item_id] = keys
+        return True
+
+    def remove(self, item_id: int) -> None:
+        """Remove a vector from the index (no-op if absent)"""
+        keys = self._keys.pop(item_id, None)
+        if keys is None:
+            return
+
+        del self._vectors[item_id]
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(item_id)
+                if not bucket:
+                    del table[key]
+
+    def query(self, vector, threshold: float) -> Optional[Tuple[int, float]]:
+        """
+        Find the most similar indexed vector among colliding candidates
+
+        Args:
+            vector: Query vector
+            threshold: Minimum cosine similarity for a match
+
+        Returns:
+            (item_id, similarity) of the best match, or None
+        """
+        unit = self._normalize(vector)
+        if unit is None:
+            return None
+
+        candidates: Set[int] = set()
+        for table, key in zip(self._tables, self._signatures(unit)):
+            candidates.update(table.get(key, ()))
+        if not candidates:
+            return None
+
+        ids = list(candidates)
+        scores = np.stack([self._vectors[i] for i in ids]) @ unit
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return ids[best], float(scores[best])
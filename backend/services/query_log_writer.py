@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from backend.config import QUERY_LOG_BATCH_SIZE, QUERY_LOG_FLUSH_INTERVAL, QUERY_LOG_QUEUE_SIZE
+from backend.database.connection import get_db_context
+from backend.database.models import QueryLog
+from backend.utils.logger import get_logger
+
+
+class QueryLogWriter:
+    """Writes query logs off the request path in batched INSERTs"""
+
+    def __init__(
+        self,
+        max_batch: int = QUERY_LOG_BATCH_SIZE,
+        flush_interval: float = QUERY_LOG_FLUSH_INTERVAL,
+        max_queue: int = QUERY_LOG_QUEUE_SIZE
+    ):
+        """
+        Initialize query log writer
+
+        Args:
+            max_batch: Maximum number of rows per INSERT
+            flush_interval: Seconds to collect rows after the first arrives
+            max_queue: Maximum number of pending rows before new logs are dropped
+        """
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.logger = get_logger(__name__)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(
+        self,
+        query: str,
+        model_used: str,
+        files_used: int = 0,
+        selected_files: Optional[List[str]] = None,
+        system_prompt_used: Optional[str] = None,
+        response_length: Optional[int] = None,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        total_tokens: Optional[int] = None,
+        success: bool = True,
+        error_message: Optional[str] = None,
+        context_cache_hit: Optional[bool] = None
+    ) -> None:
+        """
+        Queue a query log without blocking (must be called from the event loop)
+
+        Takes the same arguments as DocumentService.log_query.
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+        try:
+            self._queue.put_nowait({
+                'query': query,
+                'model_used': model_used,
+                'files_used': files_used,
+                'selected_files': selected_files or [],
+                'system_prompt_used': system_prompt_used,
+                'response_length': response_length,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': total_tokens,
+                'success': success,
+                'error_message': error_message,
+                'context_cache_hit': context_cache_hit
+            })
+        except asyncio.QueueFull:
+            self.logger.warning("Query log queue full, dropping log entry")
+
+    async def _run(self) -> None:
+        """Collect queued rows and write them in batches until a None sentinel arrives"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                return
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert a batch of query logs in a single executemany"""
+        try:
+            with get_db_context() as db:
+                db.execute(insert(QueryLog), rows)
+                db.commit()
+        except Exception as e:
+            self.logger.error(f"Error writing {len(rows)} query logs: {e}", exc_info=True)
+
+    async def close(self) -> None:
+        """Flush pending logs and stop the writer"""
+        if self._worker is None or self._worker.done():
+            return
+
+        await self._queue.put(None)
+        await self._worker
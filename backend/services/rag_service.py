@@ -1,12 +1,69 @@
 import google.generativeai as genai
 from google import genai as genai_client
-from typing import List, Optional, Dict, Any, Generator
+from google.api_core import exceptions as google_exceptions
+from typing import List, Optional, Dict, Any, AsyncGenerator, FrozenSet, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from cachetools import LRUCache, TTLCache
+import asyncio
 import os
-from backend.config import DEFAULT_MODEL, MAX_OUTPUT_TOKENS
+import threading
+import time
+from backend.config import (
+    DEFAULT_MODEL,
+    MAX_OUTPUT_TOKENS,
+    MODELS_CACHE_TTL,
+    MODEL_INSTANCE_CACHE_SIZE,
+    FILES_CACHE_TTL,
+    CONTEXT_CACHE_SIZE,
+    CONTEXT_CACHE_TTL,
+    CONTEXT_CACHE_CREATE_WAIT,
+    FILE_FETCH_CONCURRENCY,
+    FILE_HANDLE_CACHE_SIZE,
+    FILE_HANDLE_CACHE_TTL,
+    STREAM_FLUSH_BYTES,
+    STREAM_FLUSH_INTERVAL
+)
 from backend.exceptions import ModelValidationError, FileUploadError
 from backend.utils.logger import get_logger
 
 
+DEFAULT_SYSTEM_PROMPT = """The documents provided have been sorted by relevance to your question (most relevant first).
+
+Please carefully read through all document contents to find information that answers the following question:
+
+{query}
+
+If you find relevant information, please cite the specific document name(s) in your answer. If none of the documents contain relevant information, please state that clearly."""
+
+
+# Context cache creation errors that repeat for the same file set (e.g. below the
+# minimum token count, or a model without caching support)
+UNCACHEABLE_ERRORS = (google_exceptions.InvalidArgument, google_exceptions.NotFound)
+
+
+class ContextCacheMap(TTLCache):
+    """
+    Local index of Gemini context caches that deletes LRU-evicted caches server-side
+    
+    Expired entries need no cleanup: their server-side TTL runs out shortly after.
+    """
+    
+    def popitem(self):
+        key, cached_content = super().popitem()
+        if cached_content is not None:
+            threading.Thread(target=delete_context_cache, args=(cached_content,), daemon=True).start()
+        return key, cached_content
+
+
+def delete_context_cache(cached_content: Any) -> None:
+    """Delete a Gemini context cache, ignoring failures (it expires on its own)"""
+    try:
+        cached_content.delete()
+    except Exception as e:
+        get_logger(__name__).warning(f"Could not delete context cache {cached_content.name}: {e}")
+
+
 class RAGService:
     """Service for managing RAG operations with Google Gemini API"""
     
@@ -31,32 +88,66 @@ class RAGService:
         
         self.logger.info(f"API Key loaded: {api_key[:10]}...")
         
-        # Initialize available models
-        self._load_available_models()
+        # Model list rarely changes; cache it as (models, loaded_at) instead of listing
+        # on every request. Once loaded, an expired list keeps being served while a
+        # background thread reloads it
+        self._models_cache: Tuple[Optional[List[Dict[str, str]]], float] = (None, 0.0)
+        self._models_cache_lock = threading.Lock()
+        self._models_refreshing = False
+        self._model_ids: tuple = (None, frozenset())
+        
+        # GenerativeModel objects hold no per-request state, so one per model name is reused
+        self._models: LRUCache = LRUCache(maxsize=MODEL_INSTANCE_CACHE_SIZE)
+        self._models_lock = threading.Lock()
+        
+        # Uploaded-file list; every cache access holds _files_cache_lock, and
+        # concurrent misses wait on one in-flight listing under _files_lock
+        self._files_cache: TTLCache = TTLCache(maxsize=1, ttl=FILES_CACHE_TTL)
+        self._files_cache_lock = threading.Lock()
+        self._files_generation = 0
+        self._files_lock = threading.Lock()
+        
+        # Gemini context caches keyed by (model, file names); None marks a file set
+        # that could not be cached (e.g. below the minimum token count). Each key
+        # is created by one query at a time; others wait on its pending event
+        self._context_caches: ContextCacheMap = ContextCacheMap(maxsize=CONTEXT_CACHE_SIZE, ttl=CONTEXT_CACHE_TTL)
+        self._context_cache_pending: Dict[Tuple[str, Tuple[str, ...]], threading.Event] = {}
+        self._context_cache_lock = threading.Lock()
+        
+        # Files API handles by name, reused across queries on the same files
+        self._file_handles: TTLCache = TTLCache(maxsize=FILE_HANDLE_CACHE_SIZE, ttl=FILE_HANDLE_CACHE_TTL)
+        self._file_handles_lock = threading.Lock()
+        
+        # The model list is loaded on first use (the API app snapshots it at
+        # startup), so scripts that only manage files skip the listing call
+    
+    def _list_models(self) -> List[Dict[str, str]]:
+        """List generateContent-capable Gemini models from the API"""
+        available_models = []
+        
+        for model in self.client.models.list():
+            # Only select Gemini models that support generateContent
+            if 'generateContent' in model.supported_actions and 'gemini' in model.name.lower():
+                
+                model_id = model.name.replace('models/', '')
+                description = self._get_model_description(model_id)
+                
+                available_models.append({
+                    'model_id': model_id,
+                    'name': model.display_name or model_id,
+                    'description': description
+                })
+        
+        # Sort by name, prioritize latest versions
+        available_models.sort(key=lambda x: (x['model_id'].replace('-', ''), x['model_id']))
+        
+        self.logger.info(f"Loaded {len(available_models)} available models")
+        return available_models
     
     def _load_available_models(self) -> List[Dict[str, str]]:
         """Load available models from Google AI API"""
         try:
-            available_models = []
-            
-            for model in self.client.models.list():
-                # Only select Gemini models that support generateContent
-                if 'generateContent' in model.supported_actions and 'gemini' in model.name.lower():
-                    
-                    model_id = model.name.replace('models/', '')
-                    description = self._get_model_description(model_id)
-                    
-                    available_models.append({
-                        'model_id': model_id,
-                        'name': model.display_name or model_id,
-                        'description': description
-                    })
-            
-            # Sort by name, prioritize latest versions
-            available_models.sort(key=lambda x: (x['model_id'].replace('-', ''), x['model_id']))
-            
-            self.logger.info(f"Loaded {len(available_models)} available models")
-            return available_models
+            return self._list_models()
             
         except Exception as e:
             self.logger.warning(f"Could not load model list: {e}", exc_info=True)
@@ -98,11 +189,88 @@ class RAGService:
             return 'Standard Gemini model'
     
     def get_available_models(self) -> List[Dict[str, str]]:
-        """Get list of available models"""
-        return self._load_available_models()
+        """
+        Get list of available models
+        
+        Only the first call waits on the API. After MODELS_CACHE_TTL seconds the
+        cached list is still returned while a background reload picks up
+        newly released models.
+        """
+        models, loaded_at = self._models_cache
+        if models is None:
+            with self._models_cache_lock:
+                models, loaded_at = self._models_cache
+                if models is None:
+                    models = self._load_available_models()
+                    self._models_cache = (models, time.monotonic())
+                    return models
+        
+        if time.monotonic() - loaded_at > MODELS_CACHE_TTL:
+            self._start_models_refresh()
+        return models
+    
+    def _start_models_refresh(self) -> None:
+        """Reload the model list in a background thread unless one is already running"""
+        with self._models_cache_lock:
+            if self._models_refreshing:
+                return
+            self._models_refreshing = True
+        threading.Thread(target=self._refresh_models, daemon=True).start()
+    
+    def _refresh_models(self) -> None:
+        """Replace the cached model list, keeping the stale one if the API call fails"""
+        try:
+            models = self._list_models()
+        except Exception as e:
+            self.logger.warning(f"Could not refresh model list, keeping cached list: {e}")
+            models = self._models_cache[0]
+        
+        with self._models_cache_lock:
+            self._models_cache = (models, time.monotonic())
+            self._models_refreshing = False
+    
+    def get_available_model_ids(self) -> FrozenSet[str]:
+        """Get set of available model IDs for O(1) validation"""
+        models = self.get_available_models()
+        # Rebuild only when the cached model list has been refreshed
+        if self._model_ids[0] is not models:
+            self._model_ids = (models, frozenset(m['model_id'] for m in models))
+        return self._model_ids[1]
     
     def list_files(self) -> List[Dict[str, Any]]:
-        """List all uploaded files"""
+        """
+        List all uploaded files
+        
+        Served from a short-lived cache that this service drops whenever it
+        uploads or deletes files; other workers' changes show up within
+        FILES_CACHE_TTL. The returned list is shared and must not be modified.
+        """
+        with self._files_cache_lock:
+            files = self._files_cache.get('files')
+        if files is not None:
+            return files
+        
+        with self._files_lock:
+            with self._files_cache_lock:
+                files = self._files_cache.get('files')
+                generation = self._files_generation
+            if files is None:
+                files = self._fetch_files()
+                if files is not None:
+                    with self._files_cache_lock:
+                        # An upload or delete during the listing may have made it stale
+                        if generation == self._files_generation:
+                            self._files_cache['files'] = files
+        return files if files is not None else []
+    
+    def invalidate_files_cache(self) -> None:
+        """Drop the cached file list"""
+        with self._files_cache_lock:
+            self._files_generation += 1
+            self._files_cache.clear()
+    
+    def _fetch_files(self) -> Optional[List[Dict[str, Any]]]:
+        """List files from the API (None on failure, so errors are not cached)"""
         try:
             files = genai.list_files()
             return [
@@ -118,7 +286,7 @@ class RAGService:
             ]
         except Exception as e:
             self.logger.error(f"Error listing files: {e}")
-            return []
+            return None
     
     def upload_file(self, file_path: str, display_name: Optional[str] = None) -> Dict[str, Any]:
         """Upload a file to Gemini"""
@@ -129,6 +297,7 @@ class RAGService:
             )
             
             self.logger.info(f"Successfully uploaded file: {display_name or file_path}")
+            self.invalidate_files_cache()
             
             return {
                 'name': uploaded_file.name,
@@ -151,24 +320,188 @@ class RAGService:
         except Exception as e:
             self.logger.error(f"Error deleting file {file_name}: {e}")
             return False
+        finally:
+            with self._file_handles_lock:
+                self._file_handles.pop(file_name, None)
+            self.invalidate_files_cache()
+    
+    def file_exists(self, file_name: str) -> bool:
+        """
+        Check whether a file is still stored in Gemini
+        
+        Raises:
+            Exception: If the Files API call fails for any other reason
+        """
+        try:
+            genai.get_file(file_name)
+            return True
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied):
+            # The Files API answers 403 as well as 404 for files that do not exist
+            return False
+    
+    def batch_delete_files(self, file_names: List[str], max_workers: int = 16) -> int:
+        """
+        Delete multiple files from Gemini
+        
+        The Gemini Files API has no batch-delete endpoint, so deletes are
+        issued concurrently from a bounded thread pool.
+        
+        Args:
+            file_names: Names of files to delete
+            max_workers: Maximum number of concurrent delete requests
+            
+        Returns:
+            Number of files deleted
+        """
+        if not file_names:
+            return 0
+        
+        workers = min(max_workers, len(file_names))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(self.delete_file, file_names))
     
     def clear_all_files(self) -> int:
         """Clear all uploaded files"""
         files = self.list_files()
-        count = 0
-        for file in files:
-            if self.delete_file(file['name']):
-                count += 1
+        count = self.batch_delete_files([file['name'] for file in files])
         self.logger.info(f"Cleared {count} files")
         return count
     
+    def _get_model(self, model_name: str) -> Any:
+        """Get a reusable GenerativeModel for model_name"""
+        with self._models_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+        return model
+    
+    def _get_files(self, file_names: List[str]) -> List[Any]:
+        """
+        Fetch file handles for prompt context
+        
+        Handles are cached by name for FILE_HANDLE_CACHE_TTL seconds. Missing
+        lookups are independent Files API calls, so they overlap in a bounded
+        thread pool instead of costing one round trip each.
+        
+        Args:
+            file_names: Names of files to fetch
+            
+        Returns:
+            File handles in the same order as file_names
+        """
+        with self._file_handles_lock:
+            handles = {name: self._file_handles.get(name) for name in file_names}
+        missing = [name for name, handle in handles.items() if handle is None]
+        
+        if len(missing) == 1:
+            fetched = [genai.get_file(missing[0])]
+        elif missing:
+            workers = min(FILE_FETCH_CONCURRENCY, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fetched = list(executor.map(genai.get_file, missing))
+        else:
+            fetched = []
+        
+        if fetched:
+            handles.update(zip(missing, fetched))
+            with self._file_handles_lock:
+                self._file_handles.update(zip(missing, fetched))
+        
+        return [handles[name] for name in file_names]
+    
+    def _prepare_model(
+        self,
+        model_name: str,
+        selected_file_names: Optional[List[str]],
+        available_files: Optional[List[Dict[str, Any]]]
+    ) -> Tuple[Any, List[Any], int, bool]:
+        """
+        Get a model and the file prompt parts for a query
+        
+        File contexts are placed in a Gemini context cache so repeated file sets
+        skip prefill; if caching is not possible the files are sent inline.
+        
+        Args:
+            model_name: Model to use
+            selected_file_names: File names to include as context
+            available_files: Already-fetched file list (fetched if None)
+            
+        Returns:
+            Tuple of (model, file prompt parts, files used, context cache hit)
+        """
+        if not selected_file_names:
+            return self._get_model(model_name), [], 0, False
+        
+        all_files = available_files if available_files is not None else self.list_files()
+        valid_names = {f['name'] for f in all_files}
+        file_names = [name for name in selected_file_names if name in valid_names]
+        if not file_names:
+            return self._get_model(model_name), [], 0, False
+        
+        key = (model_name, tuple(file_names))
+        with self._context_cache_lock:
+            is_known = key in self._context_caches
+            cached_content = self._context_caches.get(key)
+            pending = None
+            if not is_known:
+                pending = self._context_cache_pending.get(key)
+                if pending is None:
+                    self._context_cache_pending[key] = threading.Event()
+        
+        if pending is not None:
+            # Another query is creating this cache; reuse it rather than create a duplicate
+            pending.wait(CONTEXT_CACHE_CREATE_WAIT)
+            with self._context_cache_lock:
+                is_known = True
+                cached_content = self._context_caches.get(key)
+        
+        if cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            return model, [], len(file_names), True
+        
+        if is_known:
+            return self._get_model(model_name), self._get_files(file_names), len(file_names), False
+        
+        cached_content = None
+        # Only successes and repeatable refusals are recorded; transient failures
+        # (timeouts, 5xx) are retried by the next query for this file set
+        record = False
+        try:
+            file_objs = self._get_files(file_names)
+            try:
+                # Outlive the local entry so a cache handle is never used after it expires
+                cached_content = genai.caching.CachedContent.create(
+                    model=f"models/{model_name}",
+                    contents=file_objs,
+                    ttl=timedelta(seconds=CONTEXT_CACHE_TTL + 60)
+                )
+                record = True
+            except UNCACHEABLE_ERRORS as e:
+                record = True
+                self.logger.info(f"Context cache not supported for {model_name}, sending files inline: {e}")
+            except Exception as e:
+                self.logger.warning(f"Context cache creation failed for {model_name}, sending files inline: {e}")
+        finally:
+            with self._context_cache_lock:
+                if record:
+                    self._context_caches[key] = cached_content
+                self._context_cache_pending.pop(key).set()
+        
+        if cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+            return model, [], len(file_names), False
+        
+        return self._get_model(model_name), file_objs, len(file_names), False
+    
     def query(
         self, 
         query: str, 
         model_name: Optional[str] = None, 
         selected_file_names: Optional[List[str]] = None,
         system_prompt: Optional[str] = None,
-        max_output_tokens: int = MAX_OUTPUT_TOKENS
+        max_output_tokens: int = MAX_OUTPUT_TOKENS,
+        available_files: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Query the model with optional file context and custom system prompt
@@ -179,6 +512,7 @@ class RAGService:
             selected_file_names: List of file names to include as context
             system_prompt: Custom system prompt (uses default if None)
             max_output_tokens: Maximum tokens in response
+            available_files: Already-fetched file list (fetched if None)
             
         Returns:
             Dict containing success status, response, and metadata
@@ -190,42 +524,21 @@ class RAGService:
             model_name = DEFAULT_MODEL
         
         # Validate model
-        available_model_ids = [m['model_id'] for m in self.get_available_models()]
+        available_model_ids = self.get_available_model_ids()
         if model_name not in available_model_ids:
             raise ModelValidationError(
-                f"Unsupported model: {model_name}. Available models: {', '.join(available_model_ids)}"
+                f"Unsupported model: {model_name}. Available models: {', '.join(sorted(available_model_ids))}"
             )
         
         try:
-            model = genai.GenerativeModel(model_name)
-            
-            # Build prompt content
-            prompt_parts = []
-            
-            # Add files if selected
-            files_used = 0
-            if selected_file_names:
-                all_files = self.list_files()
-                file_map = {f['name']: f for f in all_files}
-                
-                for file_name in selected_file_names:
-                    if file_name in file_map:
-                        # Add file reference
-                        file_obj = genai.get_file(file_name)
-                        prompt_parts.append(file_obj)
-                        files_used += 1
+            # Build prompt content (file contexts may come from a context cache)
+            model, prompt_parts, files_used, context_cache_hit = self._prepare_model(
+                model_name, selected_file_names, available_files
+            )
             
             # Add the actual query with custom or default system prompt
-            default_system_prompt = """The documents provided have been sorted by relevance to your question (most relevant first).
-
-Please carefully read through all document contents to find information that answers the following question:
-
-{query}
-
-If you find relevant information, please cite the specific document name(s) in your answer. If none of the documents contain relevant information, please state that clearly."""
-            
-            final_prompt = system_prompt if system_prompt else default_system_prompt
-            prompt_parts.append(final_prompt.format(query=query))
+            final_prompt = (system_prompt or DEFAULT_SYSTEM_PROMPT).format(query=query)
+            prompt_parts.append(final_prompt)
             
             # Generate response
             response = model.generate_content(
@@ -255,10 +568,11 @@ If you find relevant information, please cite the specific document name(s) in y
                 'response': response.text,
                 'model_used': model_name,
                 'files_used': files_used,
-                'system_prompt_used': system_prompt if system_prompt else default_system_prompt.format(query=query),
+                'system_prompt_used': system_prompt or final_prompt,
                 'prompt_tokens': prompt_tokens,
                 'completion_tokens': completion_tokens,
-                'total_tokens': total_tokens
+                'total_tokens': total_tokens,
+                'context_cache_hit': context_cache_hit
             }
             
         except Exception as e:
@@ -271,23 +585,30 @@ If you find relevant information, please cite the specific document name(s) in y
                 'error': str(e)
             }
     
-    def query_stream(
+    async def query_stream(
         self, 
         query: str, 
         model_name: Optional[str] = None, 
         selected_file_names: Optional[List[str]] = None,
         system_prompt: Optional[str] = None,
-        max_output_tokens: int = MAX_OUTPUT_TOKENS
-    ) -> Generator[Dict[str, Any], None, None]:
+        max_output_tokens: int = MAX_OUTPUT_TOKENS,
+        available_files: Optional[List[Dict[str, Any]]] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Query the model with streaming response - yields chunks as they arrive
         
+        Generation is streamed with the async client, so open streams wait on
+        the event loop instead of each holding a worker thread. Small token
+        deltas are coalesced into chunks of up to STREAM_FLUSH_BYTES, sent at
+        least every STREAM_FLUSH_INTERVAL seconds.
+        
         Args:
             query: User query text
             model_name: Model to use (defaults to DEFAULT_MODEL)
             selected_file_names: List of file names to include as context
             system_prompt: Custom system prompt (uses default if None)
             max_output_tokens: Maximum tokens in response
+            available_files: Already-fetched file list (fetched if None)
             
         Yields:
             Dict containing chunk data or error information
@@ -295,9 +616,8 @@ If you find relevant information, please cite the specific document name(s) in y
         if not model_name:
             model_name = DEFAULT_MODEL
         
-        # Validate model
-        available_model_ids = [m['model_id'] for m in self.get_available_models()]
-        if model_name not in available_model_ids:
+        # Validate model (may reload the model list, so kept off the event loop)
+        if model_name not in await asyncio.to_thread(self.get_available_model_ids):
             self.logger.error(f"Unsupported model in stream: {model_name}")
             yield {
                 'type': 'error',
@@ -306,39 +626,22 @@ If you find relevant information, please cite the specific document name(s) in y
             }
             return
         
+        # Text received but not yet yielded
+        pending: List[str] = []
+        
         try:
-            model = genai.GenerativeModel(model_name)
-            
-            # Build prompt content
-            prompt_parts = []
-            
-            # Add files if selected
-            files_used = 0
-            if selected_file_names:
-                all_files = self.list_files()
-                file_map = {f['name']: f for f in all_files}
-                
-                for file_name in selected_file_names:
-                    if file_name in file_map:
-                        # Add file reference
-                        file_obj = genai.get_file(file_name)
-                        prompt_parts.append(file_obj)
-                        files_used += 1
+            # Build prompt content (file contexts may come from a context cache).
+            # Files API and context cache calls block, so they run in a worker thread
+            model, prompt_parts, files_used, context_cache_hit = await asyncio.to_thread(
+                self._prepare_model, model_name, selected_file_names, available_files
+            )
             
             # Add the actual query with custom or default system prompt
-            default_system_prompt = """The documents provided have been sorted by relevance to your question (most relevant first).
-
-Please carefully read through all document contents to find information that answers the following question:
-
-{query}
-
-If you find relevant information, please cite the specific document name(s) in your answer. If none of the documents contain relevant information, please state that clearly."""
-            
-            final_prompt = system_prompt if system_prompt else default_system_prompt
-            prompt_parts.append(final_prompt.format(query=query))
+            final_prompt = (system_prompt or DEFAULT_SYSTEM_PROMPT).format(query=query)
+            prompt_parts.append(final_prompt)
             
             # Generate streaming response
-            response_stream = model.generate_content(
+            response_stream = await model.generate_content_async(
                 prompt_parts,
                 generation_config=genai.types.GenerationConfig(
                     max_output_tokens=max_output_tokens,
@@ -347,17 +650,25 @@ If you find relevant information, please cite the specific document name(s) in y
                 stream=True  # Enable streaming
             )
             
-            # Yield chunks as they arrive
+            # Yield chunks as they arrive, coalescing small deltas
             full_response = ""
-            for chunk in response_stream:
-                if chunk.text:
-                    full_response += chunk.text
-                    yield {
-                        'type': 'chunk',
-                        'text': chunk.text,
-                        'model_used': model_name,
-                        'files_used': files_used
-                    }
+            pending_bytes = 0
+            last_flush = time.monotonic()
+            async for chunk in response_stream:
+                text = chunk.text
+                if not text:
+                    continue
+                full_response += text
+                pending.append(text)
+                pending_bytes += len(text.encode('utf-8'))
+                
+                if pending_bytes >= STREAM_FLUSH_BYTES or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield self._stream_chunk(pending, model_name, files_used)
+                    pending_bytes = 0
+                    last_flush = time.monotonic()
+            
+            if pending:
+                yield self._stream_chunk(pending, model_name, files_used)
             
             # Send completion with token usage
             prompt_tokens = 0
@@ -375,20 +686,35 @@ If you find relevant information, please cite the specific document name(s) in y
             yield {
                 'type': 'complete',
                 'full_response': full_response,
-                'system_prompt_used': system_prompt if system_prompt else default_system_prompt.format(query=query),
+                'system_prompt_used': system_prompt or final_prompt,
                 'prompt_tokens': prompt_tokens,
                 'completion_tokens': completion_tokens,
-                'total_tokens': total_tokens
+                'total_tokens': total_tokens,
+                'context_cache_hit': context_cache_hit
             }
             
         except Exception as e:
             self.logger.error(f"Streaming query failed with model {model_name}: {e}", exc_info=True)
+            if pending:
+                yield self._stream_chunk(pending, model_name, files_used)
             yield {
                 'type': 'error',
                 'error': str(e),
                 'model_used': model_name
             }
     
+    @staticmethod
+    def _stream_chunk(pending: List[str], model_name: str, files_used: int) -> Dict[str, Any]:
+        """Build a chunk event from buffered text, emptying the buffer"""
+        text = ''.join(pending)
+        pending.clear()
+        return {
+            'type': 'chunk',
+            'text': text,
+            'model_used': model_name,
+            'files_used': files_used
+        }
+    
     def upload_folder(self, folder_path: str) -> Dict[str, Any]:
         """
         Upload all files from a folder to Gemini
@@ -445,4 +771,5 @@ If you find relevant information, please cite the specific document name(s) in y
                 'failed': failed,
                 'failed_count': len(failed),
                 'error': str(e)
-            }
\ No newline at end of file
+            }
+
@@ -0,0 +1,123 @@
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+import orjson
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from backend.config import RESPONSE_CACHE_TTL, REDIS_MAX_CONNECTIONS
+from backend.services.response_cache import ResponseCache
+from backend.utils.logger import get_logger
+
+VERSION_KEY = b"chat:version"
+
+
+class RedisResponseCache:
+    """Exact-match chat response cache shared by all workers through Redis"""
+
+    def __init__(
+        self,
+        url: str,
+        local_cache: ResponseCache,
+        ttl: int = RESPONSE_CACHE_TTL,
+        max_connections: int = REDIS_MAX_CONNECTIONS
+    ):
+        """
+        Initialize shared response cache
+
+        Args:
+            url: Redis connection URL
+            local_cache: This worker's in-process cache, dropped when another worker invalidates
+            ttl: Entry lifetime in seconds
+            max_connections: Connection pool size
+        """
+        self.local_cache = local_cache
+        self.ttl = ttl
+        self.logger = get_logger(__name__)
+
+        self._redis = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(url, max_connections=max_connections)
+        )
+        # Last cluster-wide cache version seen by this worker
+        self._version: Optional[int] = None
+
+    @staticmethod
+    def _key(scope: Tuple[Any, ...], message: str) -> bytes:
+        """Hash request parameters and normalized message"""
+        raw = "|".join(str(part) for part in (*scope, message.strip().lower()))
+        return b"chat:" + hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+    def _sync_version(self, raw_version: Optional[bytes]) -> int:
+        """Track the shared version, dropping local entries when another worker bumped it"""
+        version = int(raw_version) if raw_version is not None else 0
+        if self._version is not None and version != self._version:
+            self.local_cache.invalidate()
+        self._version = version
+        return version
+
+    async def get(
+        self,
+        scope: Tuple[Any, ...],
+        message: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Look up a cached response (one round trip for version and entry)
+
+        Args:
+            scope: Request parameters the response depends on
+            message: User message
+
+        Returns:
+            Tuple of (cached response fields or None, cache version to pass to put;
+            None if Redis is unavailable)
+        """
+        try:
+            raw_version, raw = await self._redis.mget(VERSION_KEY, self._key(scope, message))
+        except RedisError as e:
+            self.logger.warning(f"Redis cache lookup failed: {e}")
+            return None, None
+
+        version = self._sync_version(raw_version)
+        if raw is None:
+            return None, version
+
+        payload = orjson.loads(raw)
+        if payload['v'] != version:
+            return None, version
+        self.logger.info("Response cache hit (shared)")
+        return payload['r'], version
+
+    async def put(
+        self,
+        scope: Tuple[Any, ...],
+        message: str,
+        response: Dict[str, Any],
+        version: int
+    ) -> None:
+        """
+        Store a response under the version seen at lookup time
+
+        A response generated across an invalidation is stored under the old
+        version and so is never served.
+
+        Args:
+            scope: Request parameters the response depends on
+            message: User message
+            response: Response fields (JSON-serializable)
+            version: Version returned by get() for this request
+        """
+        payload = orjson.dumps({'v': version, 'r': response})
+        try:
+            await self._redis.set(self._key(scope, message), payload, ex=self.ttl)
+        except RedisError as e:
+            self.logger.warning(f"Redis cache store failed: {e}")
+
+    async def invalidate(self) -> None:
+        """Drop cached responses on every worker by bumping the shared version"""
+        self.local_cache.invalidate()
+        try:
+            self._version = await self._redis.incr(VERSION_KEY)
+        except RedisError as e:
+            self.logger.warning(f"Redis cache invalidation failed: {e}")
+
+    async def close(self) -> None:
+        """Close the connection pool"""
+        await self._redis.aclose()
@@ -0,0 +1,153 @@
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from cachetools import LRUCache, TTLCache
+from backend.config import (
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_SCOPES,
+    RESPONSE_CACHE_TTL,
+    SEMANTIC_CACHE_THRESHOLD
+)
+from backend.services.lsh_cache import LSHIndex
+from backend.utils.logger import get_logger
+
+
+class ResponseCache:
+    """Two-tier cache for chat responses: exact match plus embedding similarity"""
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity_threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_scopes: int = RESPONSE_CACHE_SCOPES
+    ):
+        """
+        Initialize response cache
+
+        Args:
+            maxsize: Maximum entries per tier
+            ttl: Entry lifetime in seconds
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+            max_scopes: Maximum semantic-tier scopes; least recently used are dropped
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.logger = get_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._version = 0
+        self._exact: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # scope -> (LSH index over query embeddings, {item_id: (expires_at, response)}).
+        # Scopes include the free-text system prompt, so the map is LRU-bounded
+        self._semantic: LRUCache = LRUCache(maxsize=max_scopes)
+        self._ids = itertools.count()
+
+    def _scope_key(self, scope: Tuple[Any, ...]) -> bytes:
+        """Hash request parameters (everything except the message) with the cache version"""
+        raw = "|".join(str(part) for part in (self._version, *scope))
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+    def _exact_key(self, scope: Tuple[Any, ...], message: str) -> bytes:
+        """Hash scope and normalized message for exact lookup"""
+        raw = self._scope_key(scope) + message.strip().lower().encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).digest()
+
+    def get(
+        self,
+        scope: Tuple[Any, ...],
+        message: str,
+        embedding: Optional[List[float]] = None
+    ) -> Optional[Any]:
+        """
+        Look up a cached response
+
+        Args:
+            scope: Request parameters the response depends on (model, prompt, ...)
+            message: User message
+            embedding: Query embedding for the semantic tier (skipped if None)
+
+        Returns:
+            Cached response or None on miss
+        """
+        with self._lock:
+            cached = self._exact.get(self._exact_key(scope, message))
+            if cached is not None:
+                self.logger.info("Response cache hit (exact)")
+                return cached
+
+            if embedding is None:
+                return None
+
+            entry = self._semantic.get(self._scope_key(scope))
+            if entry is None:
+                return None
+
+            # LSH narrows the lookup to colliding entries before the exact cosine check
+            index, items = entry
+            match = index.query(embedding, self.similarity_threshold)
+            if match is None:
+                return None
+
+            item_id, score = match
+            expires_at, response = items[item_id]
+            if expires_at <= time.monotonic():
+                return None
+            self.logger.info(f"Response cache hit (semantic, score {score:.3f})")
+            return response
+
+    def put(
+        self,
+        scope: Tuple[Any, ...],
+        message: str,
+        response: Any,
+        embedding: Optional[List[float]] = None
+    ) -> None:
+        """
+        Store a response in the cache
+
+        Args:
+            scope: Request parameters the response depends on
+            message: User message
+            response: Response to cache
+            embedding: Query embedding for the semantic tier (skipped if None)
+        """
+        with self._lock:
+            self._exact[self._exact_key(scope, message)] = response
+
+            if embedding is None:
+                return
+
+            scope_key = self._scope_key(scope)
+            if scope_key not in self._semantic:
+                self._semantic[scope_key] = (LSHIndex(dim=len(embedding)), OrderedDict())
+            index, items = self._semantic[scope_key]
+
+            # Entries share one TTL, so insertion order is expiry order: drop
+            # expired entries, then the oldest until there is room
+            now = time.monotonic()
+            while items:
+                oldest_id, (expires_at, _) = next(iter(items.items()))
+                if expires_at > now and len(items) < self.maxsize:
+                    break
+                items.popitem(last=False)
+                index.remove(oldest_id)
+
+            item_id = next(self._ids)
+            if index.add(item_id, embedding):
+                items[item_id] = (now + self.ttl, response)
+
+    def invalidate(self) -> None:
+        """Drop all cached responses (e.g. after the document set changes)"""
+        with self._lock:
+            self._version += 1
+            self._exact.clear()
+            self._semantic.clear()
+
+
+# Shared cache instance for chat routes
+response_cache = ResponseCache()
@@ -7,6 +7,7 @@ import sys
 from backend.config import get_settings
 from backend.services.rag_service import RAGService
 from backend.services.embedding_service import EmbeddingService
+from backend.services.embedding_store import EmbeddingStore
 from backend.services.document_service import DocumentService
 from backend.database.connection import get_db_context
 from backend.utils.logger import get_logger
@@ -27,7 +28,7 @@ def main():
     try:
         with get_db_context() as db:
             rag_service = RAGService(settings.GOOGLE_API_KEY)
-            embedding_service = EmbeddingService(settings.GOOGLE_API_KEY)
+            embedding_service = EmbeddingService(settings.GOOGLE_API_KEY, store=EmbeddingStore())
             doc_service = DocumentService(db, embedding_service)
     
             # Get all files from Gemini
@@ -1,6 +1,38 @@
 """Logging configuration for RAG application"""
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+from typing import Optional
+
+# Records are queued by the logging thread and written to stdout by a single
+# listener thread, so request handlers never block on console I/O
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _start_listener() -> None:
+    """Start the shared stdout writer thread (once per process)"""
+    global _listener
+    if _listener is not None:
+        return
+    
+    # Console handler with human-readable format
+    handler = logging.StreamHandler(sys.stdout)
+    
+    # Format: timestamp - logger_name - level - message
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    handler.setFormatter(formatter)
+    
+    _listener = logging.handlers.QueueListener(_log_queue, handler)
+    _listener.start()
+    # Flush queued records on interpreter exit
+    atexit.register(_listener.stop)
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -17,18 +49,13 @@ def get_logger(name: str) -> logging.Logger:
     
     # Only configure if not already configured
     if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        
-        # Console handler with human-readable format
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(logging.INFO)
+        # LOG_LEVEL=DEBUG enables per-message chat diagnostics
+        level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+        logger.setLevel(level)
         
-        # Format: timestamp - logger_name - level - message
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        handler.setFormatter(formatter)
+        _start_listener()
+        handler = logging.handlers.QueueHandler(_log_queue)
+        handler.setLevel(level)
         
         logger.addHandler(handler)
     
@@ -1,6 +1,7 @@
 """Startup initialization utilities"""
 from typing import TYPE_CHECKING
 from backend.utils.logger import get_logger
+from backend.config import FILE_CACHE_DIR
 import os
 
 if TYPE_CHECKING:
@@ -27,13 +28,13 @@ def initialize_app(
     # Check if files already uploaded to Gemini
     try:
         existing_files = rag_service.list_files()
-        existing_docs = doc_service.list_documents()
+        # Only the count is needed; listing would load (and cap at) 100 entities
+        indexed_count = doc_service.get_document_count()
         
         if existing_files:
             logger.info(f"Found {len(existing_files)} existing files in Gemini")
             
             # Check if documents are indexed in database
-            indexed_count = len(existing_docs)
             missing_count = len(existing_files) - indexed_count
             
             if missing_count > 0:
@@ -47,7 +48,7 @@ def initialize_app(
                 logger.info(f"All {indexed_count} files already indexed")
             
             # If database still empty after sync attempt, upload test-data
-            if len(doc_service.list_documents()) == 0:
+            if doc_service.get_document_count() == 0:
                 logger.info("Database still empty after sync, will try uploading test-data...")
             else:
                 return
@@ -67,12 +68,10 @@ def initialize_app(
                 logger.info(f"Indexing and caching {result['uploaded_count']} uploaded files...")
                 
                 # Setup cache directory
-                cache_dir = os.path.join(
-                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                    '.file_cache'
-                )
+                cache_dir = FILE_CACHE_DIR
                 os.makedirs(cache_dir, exist_ok=True)
                 
+                documents = []
                 for uploaded_file in result['uploaded']:
                     try:
                         # Read file content
@@ -81,13 +80,12 @@ def initialize_app(
                             with open(file_path, 'r', encoding='utf-8') as f:
                                 content = f.read()
                             
-                            # Create document in database
-                            doc_service.create_document(
-                                gemini_file_name=uploaded_file['name'],
-                                display_name=uploaded_file['display_name'],
-                                content=content,
-                                file_size=len(content)
-                            )
+                            documents.append({
+                                'gemini_file_name': uploaded_file['name'],
+                                'display_name': uploaded_file['display_name'],
+                                'content': content,
+                                'file_size': len(content)
+                            })
                             
                             # Cache content for future sync
                             cache_file_path = os.path.join(cache_dir, f"{uploaded_file['name']}.txt")
@@ -96,7 +94,13 @@ def initialize_app(
                                 cache_f.write(content)
                             
                     except Exception as e:
-                        logger.error(f"Error indexing {uploaded_file['display_name']}: {e}")
+                        logger.error(f"Error reading {uploaded_file['display_name']}: {e}")
+                
+                # Index all documents in a single batched INSERT
+                try:
+                    doc_service.bulk_create_documents(documents)
+                except Exception as e:
+                    logger.error(f"Error indexing uploaded files: {e}")
                 
                 logger.info(f"Successfully uploaded, indexed and cached {result['uploaded_count']} files")
                 if result['failed_count'] > 0:
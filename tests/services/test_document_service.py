@@ -1,5 +1,6 @@
 """Tests for DocumentService"""
 import pytest
+import numpy as np
 from unittest.mock import Mock, patch
 from backend.services.document_service import DocumentService
 from backend.services.embedding_service import EmbeddingService
@@ -27,9 +28,6 @@ class TestDocumentService:
         sample_embedding
     ):
         """Test successful document creation"""
-        # Mock query to return no existing document
-        mock_db_session.query.return_value.filter.return_value.first.return_value = None
-        
         service = DocumentService(mock_db_session, mock_embedding_service)
         
         result = service.create_document(**sample_document_data)
@@ -39,9 +37,37 @@ class TestDocumentService:
             sample_document_data['content']
         )
         
-        # Verify document was added and committed
-        mock_db_session.add.assert_called_once()
+        # Verify document was upserted in one statement and committed
+        mock_db_session.execute.assert_called_once()
+        mock_db_session.query.assert_not_called()
         mock_db_session.commit.assert_called_once()
+        assert result is mock_db_session.execute.return_value.scalar_one.return_value
+    
+    def test_create_document_stores_preview(self, mock_db_session, mock_embedding_service):
+        """Test the content preview is written with the document"""
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        service.create_document(
+            gemini_file_name="files/long",
+            display_name="long.txt",
+            content="x" * 500
+        )
+        
+        stmt = mock_db_session.execute.call_args[0][0]
+        assert stmt.compile().params['content_preview'] == "x" * 200 + "..."
+        # The upsert returns only the id, not the large columns just written
+        assert str(stmt.compile()).endswith("RETURNING documents.id")
+    
+    def test_create_document_stores_unit_embedding(self, mock_db_session, mock_embedding_service):
+        """Test document embeddings are normalized before they are stored"""
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        service.create_document(
+            gemini_file_name="files/test",
+            display_name="test.txt",
+            content="content"
+        )
+        
+        stmt = mock_db_session.execute.call_args[0][0]
+        assert np.linalg.norm(stmt.compile().params['embedding']) == pytest.approx(1.0, rel=1e-5)
     
     def test_create_document_embedding_failure(
         self,
@@ -64,6 +90,84 @@ class TestDocumentService:
         # Verify rollback was called
         mock_db_session.rollback.assert_called_once()
     
+    def test_bulk_create_documents_single_insert(
+        self,
+        mock_db_session,
+        mock_embedding_service,
+        sample_document_data,
+        sample_embedding
+    ):
+        """Test bulk creation embeds in batch and inserts in one statement"""
+        # Mock query to return no existing documents
+        mock_db_session.query.return_value.filter.return_value = []
+        mock_embedding_service.batch_generate_embeddings.return_value = [sample_embedding] * 2
+        mock_db_session.execute.return_value.all.return_value = [(1,), (2,)]
+        
+        second_document = dict(sample_document_data, gemini_file_name="files/test_file_456")
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        count = service.bulk_create_documents([sample_document_data, second_document])
+        
+        assert count == 2
+        mock_embedding_service.batch_generate_embeddings.assert_called_once()
+        mock_db_session.execute.assert_called_once()
+        rows = mock_db_session.execute.call_args[0][1]
+        assert [row['gemini_file_name'] for row in rows] == [
+            "files/test_file_123", "files/test_file_456"
+        ]
+        mock_db_session.commit.assert_called_once()
+    
+    def test_bulk_create_documents_counts_only_inserted_rows(
+        self,
+        mock_db_session,
+        mock_embedding_service,
+        sample_document_data,
+        sample_embedding
+    ):
+        """Test rows skipped by ON CONFLICT DO NOTHING are not reported as created"""
+        mock_db_session.query.return_value.filter.return_value = []
+        mock_embedding_service.batch_generate_embeddings.return_value = [sample_embedding] * 2
+        # A concurrent sync inserted the second document first
+        mock_db_session.execute.return_value.all.return_value = [(1,)]
+        
+        second_document = dict(sample_document_data, gemini_file_name="files/test_file_456")
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        count = service.bulk_create_documents([sample_document_data, second_document])
+        
+        assert count == 1
+    
+    def test_sync_indexes_cached_files_in_one_batch(
+        self,
+        mock_db_session,
+        mock_embedding_service,
+        sample_embedding,
+        tmp_path
+    ):
+        """Test sync skips indexed files and bulk-indexes the rest from the cache"""
+        (tmp_path / "files").mkdir()
+        (tmp_path / "files" / "new_1.txt").write_text("first", encoding='utf-8')
+        (tmp_path / "files" / "new_2.txt").write_text("second", encoding='utf-8')
+        mock_db_session.query.return_value.filter.return_value = [("files/indexed",)]
+        mock_embedding_service.batch_generate_embeddings.return_value = [sample_embedding] * 2
+        mock_db_session.execute.return_value.all.return_value = [(1,), (2,)]
+        
+        gemini_files = [
+            {'name': "files/indexed", 'display_name': "indexed.txt"},
+            {'name': "files/new_1", 'display_name': "new_1.txt", 'size_bytes': 5},
+            {'name': "files/new_2", 'display_name': "new_2.txt", 'size_bytes': 6},
+            {'name': "files/uncached", 'display_name': "uncached.txt"},
+        ]
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        with patch('backend.services.document_service.FILE_CACHE_DIR', str(tmp_path)):
+            count = service.sync_gemini_files_to_db(gemini_files)
+        
+        assert count == 2
+        mock_embedding_service.batch_generate_embeddings.assert_called_once_with(["first", "second"])
+        mock_db_session.execute.assert_called_once()
+        mock_db_session.commit.assert_called_once()
+    
     def test_delete_document_success(self, mock_db_session, mock_embedding_service):
         """Test successful document deletion"""
         # Mock existing document
@@ -88,6 +192,50 @@ class TestDocumentService:
         assert result is False
         mock_db_session.delete.assert_not_called()
     
+    def test_search_similar_documents_sets_ef_search(self, mock_db_session, mock_embedding_service):
+        """Test search widens ef_search, filters in SQL and derives similarity from distance"""
+        doc = Mock(spec=Document)
+        query = mock_db_session.query.return_value.filter.return_value.order_by.return_value
+        query.limit.return_value.all.return_value = [(doc, -0.75)]
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        results = service.search_similar_documents(
+            "query", top_k=200, similarity_threshold=0.7, query_embedding=[0.1] * 768
+        )
+        
+        assert results == [(doc, 0.75)]
+        conditions = mock_db_session.query.return_value.filter.call_args[0]
+        assert len(conditions) == 2
+        params = mock_db_session.execute.call_args[0][1]
+        assert params == {'ef': '800'}
+        query.limit.assert_called_once_with(200)
+    
+    def test_ef_search_scales_with_top_k(self):
+        """Test ef_search is sized to top_k within pgvector's bounds"""
+        assert DocumentService.ef_search_for(5) == 40
+        assert DocumentService.ef_search_for(50) == 200
+        assert DocumentService.ef_search_for(500) == 1000
+        assert DocumentService.ef_search_for(None) == 1000
+    
+    def test_get_query_stats_single_query(self, mock_db_session, mock_embedding_service):
+        """Test stats are assembled from one grouped query"""
+        mock_db_session.query.return_value.group_by.return_value.all.return_value = [
+            ("gemini-1.5-flash", 3, 2, 3, 3, 300, 2),
+            ("gemini-1.5-pro", 1, 1, 1, 1, None, 0),
+        ]
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        stats = service.get_query_stats()
+        
+        mock_db_session.query.assert_called_once()
+        assert stats.total_queries == 4
+        assert stats.successful_queries == 3
+        assert stats.success_rate == 75.0
+        assert stats.model_usage == {"gemini-1.5-flash": 3, "gemini-1.5-pro": 1}
+        assert stats.avg_files_used == 1.0
+        assert stats.total_tokens_used == 300
+        assert stats.avg_tokens_per_query == 150.0
+    
     def test_get_document_count(self, mock_db_session, mock_embedding_service):
         """Test getting document count"""
         mock_db_session.query.return_value.scalar.return_value = 5
@@ -106,3 +254,48 @@ class TestDocumentService:
         results = service.list_documents(limit=10, offset=0)
         
         assert len(results) == 3
+    
+    def test_get_query_history_returns_row_dicts(self, mock_db_session, mock_embedding_service):
+        """Test query history is built from column rows"""
+        from datetime import datetime
+        
+        row = Mock()
+        row._mapping = {'id': 1, 'query': 'test', 'created_at': datetime(2024, 1, 1)}
+        mock_db_session.query.return_value.select_from.return_value.scalar.return_value = 1
+        mock_db_session.query.return_value.order_by.return_value.offset.return_value.limit.return_value.all.return_value = [row]
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        
+        with patch('backend.services.document_service.QueryHistoryResponse') as mock_response:
+            service.get_query_history(page=1, page_size=10)
+        
+        history = mock_response.call_args[1]['history']
+        assert history == [{'id': 1, 'query': 'test', 'created_at': '2024-01-01T00:00:00'}]
+    
+    def test_get_query_history_with_cursor_uses_keyset(self, mock_db_session, mock_embedding_service):
+        """Test a cursor filters by id instead of skipping rows with OFFSET"""
+        query = mock_db_session.query.return_value
+        query.filter.return_value.order_by.return_value.limit.return_value.all.return_value = []
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        
+        with patch('backend.services.document_service.QueryHistoryResponse'):
+            service.get_query_history(page_size=10, after_id=500)
+        
+        assert str(query.filter.call_args[0][0].compile(compile_kwargs={'literal_binds': True})) == \
+            "query_logs.id < 500"
+        query.filter.return_value.order_by.return_value.limit.assert_called_once_with(10)
+        query.offset.assert_not_called()
+    
+    def test_get_query_history_with_known_total_skips_count(self, mock_db_session, mock_embedding_service):
+        """Test cursor pages reuse the first page's total instead of counting again"""
+        query = mock_db_session.query.return_value
+        query.filter.return_value.order_by.return_value.limit.return_value.all.return_value = []
+        
+        service = DocumentService(mock_db_session, mock_embedding_service)
+        
+        with patch('backend.services.document_service.QueryHistoryResponse') as mock_response:
+            service.get_query_history(page_size=10, after_id=500, total=1234)
+        
+        assert mock_db_session.query.call_count == 1
+        assert mock_response.call_args[1]['total'] == 1234
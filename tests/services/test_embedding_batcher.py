@@ -0,0 +1,45 @@
+"""Tests for EmbeddingBatcher"""
+import asyncio
+import pytest
+from unittest.mock import Mock
+from backend.services.embedding_batcher import EmbeddingBatcher
+from backend.services.embedding_service import EmbeddingService
+from backend.exceptions import EmbeddingError
+
+
+class TestEmbeddingBatcher:
+    """Test cases for EmbeddingBatcher"""
+    
+    @pytest.fixture
+    def mock_embedding_service(self):
+        """Mock embedding service fixture"""
+        service = Mock(spec=EmbeddingService)
+        service.batch_generate_query_embeddings.side_effect = lambda texts: [
+            [float(len(text))] for text in texts
+        ]
+        return service
+    
+    def test_concurrent_embeds_share_one_call(self, mock_embedding_service):
+        """Test concurrent queries are coalesced into a single batch call"""
+        batcher = EmbeddingBatcher(mock_embedding_service, max_batch=64, window=0.05)
+        
+        async def run():
+            return await asyncio.gather(*(batcher.embed("q" * n) for n in range(1, 6)))
+        
+        results = asyncio.run(run())
+        
+        assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+        mock_embedding_service.batch_generate_query_embeddings.assert_called_once()
+        assert batcher.stats()['batches'] == 1
+    
+    def test_batch_failure_propagates(self, mock_embedding_service):
+        """Test embedding errors are raised to every waiting caller"""
+        mock_embedding_service.batch_generate_query_embeddings.side_effect = EmbeddingError("API error")
+        batcher = EmbeddingBatcher(mock_embedding_service, window=0.01)
+        
+        with pytest.raises(EmbeddingError):
+            asyncio.run(batcher.embed("test query"))
+        
+        stats = batcher.stats()
+        assert stats['batches'] == 1
+        assert stats['failed_batches'] == 1
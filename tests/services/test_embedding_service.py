@@ -1,7 +1,9 @@
 """Tests for EmbeddingService"""
 import pytest
+import numpy as np
 from unittest.mock import patch, Mock
 from backend.services.embedding_service import EmbeddingService
+from backend.services.embedding_store import EmbeddingStore
 from backend.exceptions import EmbeddingError
 
 
@@ -29,7 +31,8 @@ class TestEmbeddingService:
             service = EmbeddingService(mock_api_key)
             result = service.generate_embedding("test text")
             
-            assert result == sample_embedding
+            assert result.dtype == np.float32
+            np.testing.assert_allclose(result, sample_embedding, rtol=1e-6)
             assert len(result) == 768
     
     def test_generate_embedding_failure(self, mock_api_key):
@@ -50,7 +53,7 @@ class TestEmbeddingService:
             service = EmbeddingService(mock_api_key)
             result = service.generate_query_embedding("test query")
             
-            assert result == sample_embedding
+            np.testing.assert_allclose(result, sample_embedding, rtol=1e-6)
             mock_genai.embed_content.assert_called_once()
             
             # Verify task_type is 'retrieval_query' for queries
@@ -70,3 +73,62 @@ class TestEmbeddingService:
         # Identical vectors should have similarity 1.0
         similarity_identical = EmbeddingService.cosine_similarity(vec1, vec3)
         assert abs(similarity_identical - 1.0) < 0.01
+    
+    def test_batch_generate_embeddings_preserves_order(self, mock_api_key):
+        """Test batch embedding sends one call per batch and keeps input order"""
+        with patch('backend.services.embedding_service.genai') as mock_genai, \
+                patch('backend.services.embedding_service.EMBEDDING_DOC_BATCH_SIZE', 4):
+            mock_genai.embed_content.side_effect = lambda model, content, task_type: {
+                'embedding': [[float(len(text))] * 768 for text in content]
+            }
+            
+            service = EmbeddingService(mock_api_key)
+            texts = ["a" * n for n in range(1, 11)]
+            result = service.batch_generate_embeddings(texts)
+            
+            assert [vec[0] for vec in result] == [float(n) for n in range(1, 11)]
+            assert mock_genai.embed_content.call_count == 3
+    
+    def test_query_embedding_is_cached(self, mock_api_key, sample_embedding):
+        """Test repeated queries are served from the embedding cache"""
+        with patch('backend.services.embedding_service.genai') as mock_genai:
+            mock_genai.embed_content.return_value = {'embedding': sample_embedding}
+            
+            service = EmbeddingService(mock_api_key)
+            service.generate_query_embedding("test query")
+            result = service.generate_query_embedding("test query")
+            
+            np.testing.assert_allclose(result, sample_embedding, rtol=1e-6)
+            mock_genai.embed_content.assert_called_once()
+            assert service.stats() == {'hits': 1, 'misses': 1, 'size': 1}
+    
+    def test_batch_query_embeddings_only_sends_misses(self, mock_api_key):
+        """Test batched queries embed only uncached, unique texts"""
+        with patch('backend.services.embedding_service.genai') as mock_genai:
+            mock_genai.embed_content.side_effect = [
+                {'embedding': [[1.0]]},
+                {'embedding': [[2.0]]}
+            ]
+            
+            service = EmbeddingService(mock_api_key)
+            service.batch_generate_query_embeddings(["a"])
+            result = service.batch_generate_query_embeddings(["a", "b", "b"])
+            
+            assert result == [[1.0], [2.0], [2.0]]
+            assert mock_genai.embed_content.call_args[1]['content'] == ["b"]
+    
+    def test_batch_embeddings_reuse_stored_documents(self, mock_api_key):
+        """Test stored document embeddings skip the API and new ones are stored"""
+        store = Mock(spec=EmbeddingStore)
+        store.content_hash.side_effect = EmbeddingStore.content_hash
+        store.get_many.return_value = {EmbeddingStore.content_hash("old"): [1.0]}
+        
+        with patch('backend.services.embedding_service.genai') as mock_genai:
+            mock_genai.embed_content.return_value = {'embedding': [2.0]}
+            
+            service = EmbeddingService(mock_api_key, store=store)
+            result = service.batch_generate_embeddings(["old", "new", "new"])
+            
+            assert result == [[1.0], [2.0], [2.0]]
+            mock_genai.embed_content.assert_called_once()
+            store.put_many.assert_called_once_with({EmbeddingStore.content_hash("new"): [2.0]})
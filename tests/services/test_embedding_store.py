@@ -0,0 +1,42 @@
+"""Tests for EmbeddingStore"""
+from unittest.mock import MagicMock, patch
+import numpy as np
+from backend.services.embedding_store import EmbeddingStore
+
+
+class TestEmbeddingStore:
+    """Test cases for EmbeddingStore"""
+
+    @patch('backend.services.embedding_store.get_db_context')
+    def test_get_many_decodes_vectors_and_counts_hits(self, mock_db_context):
+        """Test stored float32 bytes are returned as embeddings"""
+        mock_db = MagicMock()
+        mock_db_context.return_value.__enter__.return_value = mock_db
+        stored = EmbeddingStore.content_hash("stored")
+        mock_db.execute.return_value.all.return_value = [
+            (stored, np.array([0.5, 1.0], dtype=np.float32).tobytes())
+        ]
+
+        store = EmbeddingStore()
+        found = store.get_many([stored, EmbeddingStore.content_hash("missing")])
+
+        assert list(found) == [stored]
+        assert found[stored].tolist() == [0.5, 1.0]
+        assert store.stats() == {'hits': 1, 'misses': 1}
+
+    @patch('backend.services.embedding_store.get_db_context')
+    def test_put_many_and_lookup_failure(self, mock_db_context):
+        """Test rows are written in one statement and errors degrade to misses"""
+        mock_db = MagicMock()
+        mock_db_context.return_value.__enter__.return_value = mock_db
+
+        store = EmbeddingStore()
+        store.put_many({b"h" * 32: [0.25, 0.75]})
+
+        rows = mock_db.execute.call_args[0][1]
+        assert rows[0]['dim'] == 2
+        assert np.frombuffer(rows[0]['vector'], dtype=np.float32).tolist() == [0.25, 0.75]
+        mock_db.commit.assert_called_once()
+
+        mock_db.execute.side_effect = Exception("connection refused")
+        assert store.get_many([b"h" * 32]) == {}
@@ -0,0 +1,52 @@
+"""Tests for LSHIndex"""
+import numpy as np
+from backend.services.lsh_cache import LSHIndex
+
+
+class TestLSHIndex:
+    """Test cases for LSHIndex"""
+
+    def test_query_finds_near_duplicate(self):
+        """Test a slightly perturbed vector matches the indexed one"""
+        rng = np.random.default_rng(1)
+        vectors = rng.standard_normal((50, 768))
+        index = LSHIndex(dim=768)
+        for i, vector in enumerate(vectors):
+            index.add(i, vector)
+
+        query = vectors[7] + rng.standard_normal(768) * 0.05
+        item_id, score = index.query(query, threshold=0.95)
+
+        assert item_id == 7
+        assert score > 0.95
+
+    def test_query_below_threshold_returns_none(self):
+        """Test unrelated vectors do not match"""
+        index = LSHIndex(dim=3)
+        index.add(0, [1.0, 0.0, 0.0])
+
+        assert index.query([0.0, 1.0, 0.0], threshold=0.95) is None
+
+    def test_remove_drops_vector(self):
+        """Test removed vectors are no longer returned"""
+        index = LSHIndex(dim=3)
+        index.add(0, [1.0, 0.0, 0.0])
+        index.remove(0)
+
+        assert len(index) == 0
+        assert index.query([1.0, 0.0, 0.0], threshold=0.5) is None
+
+    def test_zero_vector_is_not_indexed(self):
+        """Test all-zero vectors are rejected"""
+        index = LSHIndex(dim=3)
+
+        assert index.add(0, [0.0, 0.0, 0.0]) is False
+        assert len(index) == 0
+
+    def test_indexes_share_hyperplanes(self):
+        """Test indexes with the same parameters reuse one read-only plane matrix"""
+        first = LSHIndex(dim=3)
+        second = LSHIndex(dim=3)
+
+        assert first._planes is second._planes
+        assert not first._planes.flags.writeable
@@ -0,0 +1,54 @@
+"""Tests for QueryLogWriter"""
+import asyncio
+from unittest.mock import MagicMock, patch
+from backend.services.query_log_writer import QueryLogWriter
+
+
+class TestQueryLogWriter:
+    """Test cases for QueryLogWriter"""
+
+    @patch('backend.services.query_log_writer.get_db_context')
+    def test_submissions_are_written_in_one_batch(self, mock_db_context):
+        """Test queued logs are flushed with a single INSERT"""
+        mock_db = MagicMock()
+        mock_db_context.return_value.__enter__.return_value = mock_db
+
+        async def run():
+            writer = QueryLogWriter(max_batch=10, flush_interval=0.05)
+            writer.submit(query="first", model_used="gemini-1.5-flash")
+            writer.submit(query="second", model_used="gemini-1.5-flash", success=False)
+            await asyncio.sleep(0.2)
+            await writer.close()
+
+        asyncio.run(run())
+
+        assert mock_db.execute.call_count == 1
+        rows = mock_db.execute.call_args[0][1]
+        assert [row['query'] for row in rows] == ["first", "second"]
+        assert rows[0]['selected_files'] == []
+        assert rows[1]['success'] is False
+        mock_db.commit.assert_called_once()
+
+    @patch('backend.services.query_log_writer.get_db_context')
+    def test_close_flushes_pending_logs(self, mock_db_context):
+        """Test shutdown writes logs that were still queued"""
+        mock_db = MagicMock()
+        mock_db_context.return_value.__enter__.return_value = mock_db
+
+        async def run():
+            writer = QueryLogWriter(max_batch=10, flush_interval=10)
+            writer.submit(query="pending", model_used="gemini-1.5-flash")
+            await writer.close()
+
+        asyncio.run(run())
+
+        rows = [row for call in mock_db.execute.call_args_list for row in call[0][1]]
+        assert [row['query'] for row in rows] == ["pending"]
+
+    @patch('backend.services.query_log_writer.get_db_context')
+    def test_write_errors_are_swallowed(self, mock_db_context):
+        """Test a failing INSERT does not raise into the caller"""
+        mock_db_context.return_value.__enter__.side_effect = Exception("DB down")
+
+        writer = QueryLogWriter()
+        writer._write([{'query': "q"}])
@@ -1,7 +1,11 @@
 """Tests for RAGService"""
+import asyncio
+import time
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from backend.services.rag_service import RAGService
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
+from google.api_core import exceptions as google_exceptions
+from backend.services.rag_service import RAGService, ContextCacheMap, DEFAULT_SYSTEM_PROMPT
 from backend.exceptions import ModelValidationError, FileUploadError
 
 
@@ -46,6 +50,50 @@ class TestRAGService:
             assert files[0]['name'] == "files/test_123"
             assert files[0]['display_name'] == "test.txt"
     
+    def test_list_files_is_cached_until_files_change(self, mock_api_key):
+        """Test the file list is fetched once and refetched after a delete"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.list_files.return_value = []
+            
+            service = RAGService(mock_api_key)
+            service.list_files()
+            service.list_files()
+            assert mock_genai.list_files.call_count == 1
+            
+            service.delete_file("files/test_123")
+            service.list_files()
+            assert mock_genai.list_files.call_count == 2
+    
+    def test_list_files_does_not_cache_listing_invalidated_mid_fetch(self, mock_api_key):
+        """Test a listing that raced an upload or delete is returned but not cached"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+
+            service = RAGService(mock_api_key)
+
+            def list_files():
+                service.invalidate_files_cache()
+                return []
+            mock_genai.list_files.side_effect = list_files
+
+            assert service.list_files() == []
+            service.list_files()
+            assert mock_genai.list_files.call_count == 2
+
+    def test_list_files_errors_are_not_cached(self, mock_api_key):
+        """Test a failed listing returns empty and is retried on the next call"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.list_files.side_effect = [Exception("API down"), []]
+            
+            service = RAGService(mock_api_key)
+            assert service.list_files() == []
+            assert service.list_files() == []
+            assert mock_genai.list_files.call_count == 2
+    
     def test_query_with_invalid_model(self, mock_api_key):
         """Test query with invalid model raises ModelValidationError"""
         with patch('backend.services.rag_service.genai'), \
@@ -94,3 +142,370 @@ class TestRAGService:
             
             with pytest.raises(FileUploadError):
                 service.upload_file("/path/to/file.txt")
+    
+    def test_query_reuses_prefetched_files(self, mock_api_key):
+        """Test query uses provided file list instead of listing files again"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            
+            result = service.query(
+                "test query",
+                model_name="gemini-1.5-flash",
+                selected_file_names=["files/test_123"],
+                available_files=[{'name': "files/test_123"}]
+            )
+            
+            assert result['success'] is True
+            assert result['files_used'] == 1
+            mock_genai.list_files.assert_not_called()
+    
+    def test_batch_delete_files_counts_successes(self, mock_api_key):
+        """Test batch delete returns number of successfully deleted files"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.delete_file.side_effect = [None, Exception("Not found"), None]
+            
+            service = RAGService(mock_api_key)
+            count = service.batch_delete_files(["files/a", "files/b", "files/c"], max_workers=1)
+            
+            assert count == 2
+            assert mock_genai.delete_file.call_count == 3
+    
+    def test_clear_all_files_uses_batch_delete(self, mock_api_key):
+        """Test clearing files deletes every listed file through the batch path"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_file = Mock()
+            mock_file.name = "files/a"
+            mock_file.display_name = "a.txt"
+            mock_genai.list_files.return_value = [mock_file]
+            
+            service = RAGService(mock_api_key)
+            with patch.object(service, 'batch_delete_files', return_value=1) as mock_batch:
+                count = service.clear_all_files()
+            
+            assert count == 1
+            mock_batch.assert_called_once_with(["files/a"])
+    
+    def test_available_models_are_cached(self, mock_api_key):
+        """Test model list is loaded once and model IDs are served from a set"""
+        with patch('backend.services.rag_service.genai'), \
+             patch('backend.services.rag_service.genai_client') as mock_client:
+            
+            mock_model = Mock()
+            mock_model.name = "models/gemini-1.5-flash"
+            mock_model.display_name = "Gemini 1.5 Flash"
+            mock_model.supported_actions = ['generateContent']
+            mock_client.Client.return_value.models.list.return_value = [mock_model]
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models()
+            model_ids = service.get_available_model_ids()
+            
+            assert model_ids == frozenset({'gemini-1.5-flash'})
+            assert service.get_available_model_ids() is model_ids
+            mock_client.Client.return_value.models.list.assert_called_once()
+    
+    def test_query_reuses_context_cache_for_same_files(self, mock_api_key):
+        """Test repeated file sets are served from the Gemini context cache"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            files = [{'name': "files/test_123"}]
+            
+            first = service.query("first", model_name="gemini-1.5-flash",
+                                  selected_file_names=["files/test_123"], available_files=files)
+            second = service.query("second", model_name="gemini-1.5-flash",
+                                   selected_file_names=["files/test_123"], available_files=files)
+            
+            assert first['context_cache_hit'] is False
+            assert second['context_cache_hit'] is True
+            mock_genai.caching.CachedContent.create.assert_called_once()
+            mock_genai.get_file.assert_called_once_with("files/test_123")
+    
+    def test_query_sends_files_inline_when_context_cache_fails(self, mock_api_key):
+        """Test files are sent with the prompt when a context cache cannot be created"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.caching.CachedContent.create.side_effect = google_exceptions.InvalidArgument("Too few tokens")
+            mock_file = Mock()
+            mock_genai.get_file.return_value = mock_file
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            files = [{'name': "files/test_123"}]
+            
+            service.query("first", model_name="gemini-1.5-flash",
+                          selected_file_names=["files/test_123"], available_files=files)
+            result = service.query("second", model_name="gemini-1.5-flash",
+                                   selected_file_names=["files/test_123"], available_files=files)
+            
+            assert result['success'] is True
+            assert result['files_used'] == 1
+            mock_genai.caching.CachedContent.create.assert_called_once()
+            prompt_parts = mock_genai.GenerativeModel.return_value.generate_content.call_args[0][0]
+            assert prompt_parts[0] is mock_file
+    
+    def test_get_files_preserves_order(self, mock_api_key):
+        """Test concurrent file lookups return handles in the requested order"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.get_file.side_effect = lambda name: f"handle:{name}"
+            
+            service = RAGService(mock_api_key)
+            handles = service._get_files(["files/a", "files/b", "files/c"])
+            
+            assert handles == ["handle:files/a", "handle:files/b", "handle:files/c"]
+            assert mock_genai.get_file.call_count == 3
+    
+    def test_get_files_caches_handles_until_deleted(self, mock_api_key):
+        """Test file handles are reused across lookups and dropped on delete"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            service._get_files(["files/a"])
+            service._get_files(["files/a"])
+            assert mock_genai.get_file.call_count == 1
+            
+            service.delete_file("files/a")
+            service._get_files(["files/a"])
+            assert mock_genai.get_file.call_count == 2
+    
+    def test_generative_model_is_reused_across_queries(self, mock_api_key):
+        """Test one GenerativeModel is built per model name"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            
+            service.query("first", model_name="gemini-1.5-flash")
+            service.query("second", model_name="gemini-1.5-flash")
+            
+            mock_genai.GenerativeModel.assert_called_once_with("gemini-1.5-flash")
+    
+    def test_query_reports_formatted_default_prompt(self, mock_api_key):
+        """Test the default prompt is sent and reported with the query filled in"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            
+            result = service.query("what is rag?", model_name="gemini-1.5-flash")
+            
+            expected = DEFAULT_SYSTEM_PROMPT.format(query="what is rag?")
+            assert result['system_prompt_used'] == expected
+            prompt_parts = mock_genai.GenerativeModel.return_value.generate_content.call_args[0][0]
+            assert prompt_parts == [expected]
+    
+    def test_query_stream_uses_async_generation(self, mock_api_key):
+        """Test streaming yields chunks from the async client and a completion event"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            class FakeStream:
+                usage_metadata = Mock(prompt_token_count=3, candidates_token_count=2, total_token_count=5)
+                
+                async def __aiter__(self):
+                    for text in ("Hel", "lo"):
+                        yield Mock(text=text)
+            
+            mock_genai.GenerativeModel.return_value.generate_content_async = AsyncMock(
+                return_value=FakeStream()
+            )
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            
+            async def collect():
+                return [event async for event in service.query_stream("hi", model_name="gemini-1.5-flash")]
+            
+            events = asyncio.run(collect())
+            
+            # Deltas arriving within the flush interval are coalesced
+            assert [e['text'] for e in events if e['type'] == 'chunk'] == ["Hello"]
+            assert events[-1]['type'] == 'complete'
+            assert events[-1]['full_response'] == "Hello"
+            assert events[-1]['total_tokens'] == 5
+            mock_genai.GenerativeModel.return_value.generate_content.assert_not_called()
+    
+    def test_concurrent_model_list_misses_load_once(self, mock_api_key):
+        """Test concurrent callers share a single model list load"""
+        with patch('backend.services.rag_service.genai'), \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            
+            def slow_load():
+                time.sleep(0.05)
+                return [{'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}]
+            
+            with patch.object(service, '_load_available_models', side_effect=slow_load) as mock_load:
+                with ThreadPoolExecutor(max_workers=4) as executor:
+                    results = list(executor.map(lambda _: service.get_available_models(), range(4)))
+            
+            mock_load.assert_called_once()
+            assert all(result is results[0] for result in results)
+    
+    def test_expired_model_list_is_served_while_refreshing(self, mock_api_key):
+        """Test an expired model list is returned immediately and reloaded in the background"""
+        with patch('backend.services.rag_service.genai'), \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            stale = [{'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}]
+            fresh = stale + [{'model_id': 'gemini-2.0-flash', 'name': 'Flash 2', 'description': 'Fast'}]
+            service._models_cache = (stale, 0.0)
+            
+            with patch.object(service, '_list_models', return_value=fresh), \
+                 patch('backend.services.rag_service.threading.Thread') as mock_thread:
+                assert service.get_available_models() is stale
+                # Refresh already in flight: no second thread
+                assert service.get_available_models() is stale
+                mock_thread.assert_called_once()
+                
+                service._refresh_models()
+            
+            assert service.get_available_models() is fresh
+            assert 'gemini-2.0-flash' in service.get_available_model_ids()
+    
+    def test_failed_model_refresh_keeps_cached_list(self, mock_api_key):
+        """Test a failed background reload keeps serving the cached model list"""
+        with patch('backend.services.rag_service.genai'), \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            stale = [{'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}]
+            service._models_cache = (stale, 0.0)
+            
+            with patch.object(service, '_list_models', side_effect=Exception("API down")):
+                service._refresh_models()
+            
+            assert service.get_available_models() is stale
+            assert service._models_refreshing is False
+    
+    def test_query_stream_flushes_when_buffer_is_full(self, mock_api_key):
+        """Test coalesced text is flushed once the byte threshold is reached"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'), \
+             patch('backend.services.rag_service.STREAM_FLUSH_BYTES', 4), \
+             patch('backend.services.rag_service.STREAM_FLUSH_INTERVAL', 60):
+            
+            class FakeStream:
+                usage_metadata = None
+                
+                async def __aiter__(self):
+                    for text in ("ab", "cd", "e"):
+                        yield Mock(text=text)
+            
+            mock_genai.GenerativeModel.return_value.generate_content_async = AsyncMock(
+                return_value=FakeStream()
+            )
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            
+            async def collect():
+                return [event async for event in service.query_stream("hi", model_name="gemini-1.5-flash")]
+            
+            events = asyncio.run(collect())
+            
+            assert [e['text'] for e in events if e['type'] == 'chunk'] == ["abcd", "e"]
+            assert events[-1]['full_response'] == "abcde"
+    
+    def test_transient_context_cache_failure_is_retried(self, mock_api_key):
+        """Test a transient cache creation error is not remembered for the file set"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            mock_genai.caching.CachedContent.create.side_effect = [Exception("503 Unavailable"), Mock()]
+            
+            service = RAGService(mock_api_key)
+            service.get_available_models = Mock(return_value=[
+                {'model_id': 'gemini-1.5-flash', 'name': 'Flash', 'description': 'Fast'}
+            ])
+            files = [{'name': "files/test_123"}]
+            
+            first = service.query("first", model_name="gemini-1.5-flash",
+                                  selected_file_names=["files/test_123"], available_files=files)
+            second = service.query("second", model_name="gemini-1.5-flash",
+                                   selected_file_names=["files/test_123"], available_files=files)
+            
+            assert first['success'] is True and second['success'] is True
+            assert mock_genai.caching.CachedContent.create.call_count == 2
+    
+    def test_concurrent_context_cache_misses_create_once(self, mock_api_key):
+        """Test concurrent queries for the same file set share one context cache"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            def slow_create(**kwargs):
+                time.sleep(0.05)
+                return Mock()
+            
+            mock_genai.caching.CachedContent.create.side_effect = slow_create
+            
+            service = RAGService(mock_api_key)
+            files = [{'name': "files/test_123"}]
+            
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(
+                    lambda _: service._prepare_model("gemini-1.5-flash", ["files/test_123"], files),
+                    range(4)
+                ))
+            
+            mock_genai.caching.CachedContent.create.assert_called_once()
+            assert sum(1 for result in results if result[3]) == 3
+    
+    def test_evicted_context_cache_is_deleted(self):
+        """Test context caches pushed out of the local index are deleted server-side"""
+        caches = ContextCacheMap(maxsize=1, ttl=60)
+        evicted = Mock()
+        
+        with patch('backend.services.rag_service.threading.Thread') as mock_thread:
+            caches['a'] = evicted
+            caches['b'] = Mock()
+            caches['c'] = None
+        
+        assert mock_thread.call_count == 2
+        assert mock_thread.call_args_list[0].kwargs['args'] == (evicted,)
+    
+    def test_file_exists_distinguishes_missing_files_from_errors(self, mock_api_key):
+        """Test missing files report False while other API errors propagate"""
+        with patch('backend.services.rag_service.genai') as mock_genai, \
+             patch('backend.services.rag_service.genai_client'):
+            
+            service = RAGService(mock_api_key)
+            assert service.file_exists("files/a") is True
+            
+            mock_genai.get_file.side_effect = google_exceptions.PermissionDenied("No such file")
+            assert service.file_exists("files/a") is False
+            
+            mock_genai.get_file.side_effect = google_exceptions.ServiceUnavailable("Down")
+            with pytest.raises(google_exceptions.ServiceUnavailable):
+                service.file_exists("files/a")
@@ -0,0 +1,80 @@
+"""Tests for RedisResponseCache"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+import orjson
+from redis.exceptions import RedisError
+from backend.services.redis_cache import RedisResponseCache, VERSION_KEY
+
+
+def make_cache():
+    local_cache = MagicMock()
+    cache = RedisResponseCache("redis://localhost:6379/0", local_cache)
+    cache._redis = AsyncMock()
+    return cache, local_cache
+
+
+class TestRedisResponseCache:
+    """Test cases for RedisResponseCache"""
+
+    def test_hit_returns_response_for_current_version(self):
+        """Test an entry stored under the current version is served"""
+        cache, _ = make_cache()
+        payload = orjson.dumps({'v': 3, 'r': {'response': "cached"}})
+        cache._redis.mget.return_value = [b"3", payload]
+
+        response, version = asyncio.run(cache.get(("m",), "Hello"))
+
+        assert response == {'response': "cached"}
+        assert version == 3
+
+    def test_stale_version_is_a_miss(self):
+        """Test entries written before an invalidation are ignored"""
+        cache, _ = make_cache()
+        payload = orjson.dumps({'v': 2, 'r': {'response': "old"}})
+        cache._redis.mget.return_value = [b"3", payload]
+
+        response, version = asyncio.run(cache.get(("m",), "Hello"))
+
+        assert response is None
+        assert version == 3
+
+    def test_version_bump_drops_local_cache(self):
+        """Test another worker's invalidation clears this worker's local cache"""
+        cache, local_cache = make_cache()
+
+        async def run():
+            cache._redis.mget.return_value = [b"1", None]
+            await cache.get(("m",), "Hello")
+            local_cache.invalidate.assert_not_called()
+
+            cache._redis.mget.return_value = [b"2", None]
+            await cache.get(("m",), "Hello")
+
+        asyncio.run(run())
+
+        local_cache.invalidate.assert_called_once()
+
+    def test_put_and_invalidate(self):
+        """Test put stores under the given version and invalidate bumps it"""
+        cache, local_cache = make_cache()
+        cache._redis.incr.return_value = 5
+
+        async def run():
+            await cache.put(("m",), "Hello", {'response': "hi"}, 4)
+            await cache.invalidate()
+
+        asyncio.run(run())
+
+        key, payload = cache._redis.set.call_args[0]
+        assert key == cache._key(("m",), "  hello ")
+        assert orjson.loads(payload) == {'v': 4, 'r': {'response': "hi"}}
+        assert cache._redis.set.call_args[1]['ex'] == cache.ttl
+        cache._redis.incr.assert_called_once_with(VERSION_KEY)
+        local_cache.invalidate.assert_called_once()
+
+    def test_redis_failure_is_a_miss(self):
+        """Test lookup errors fall back to generating a response"""
+        cache, _ = make_cache()
+        cache._redis.mget.side_effect = RedisError("down")
+
+        assert asyncio.run(cache.get(("m",), "Hello")) == (None, None)
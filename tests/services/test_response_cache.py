@@ -0,0 +1,63 @@
+"""Tests for ResponseCache"""
+import pytest
+from backend.services.response_cache import ResponseCache
+
+
+class TestResponseCache:
+    """Test cases for ResponseCache"""
+
+    @pytest.fixture
+    def cache(self):
+        """Response cache fixture"""
+        return ResponseCache(maxsize=16, ttl=60, similarity_threshold=0.95)
+
+    @pytest.fixture
+    def scope(self):
+        """Request scope fixture"""
+        return ("gemini-1.5-flash", None, (), True, 5, 0.7)
+
+    def test_exact_hit_normalizes_message(self, cache, scope):
+        """Test exact lookup ignores case and surrounding whitespace"""
+        cache.put(scope, "Who has CISSP?", "cached")
+
+        assert cache.get(scope, "  who has cissp?  ") == "cached"
+
+    def test_miss_for_different_scope(self, cache, scope):
+        """Test responses are not shared across models or prompts"""
+        cache.put(scope, "query", "cached")
+        other_scope = ("gemini-1.5-pro",) + scope[1:]
+
+        assert cache.get(other_scope, "query") is None
+
+    def test_semantic_hit_above_threshold(self, cache, scope):
+        """Test similar embeddings return the cached response"""
+        cache.put(scope, "first query", "cached", embedding=[1.0, 0.0, 0.0])
+
+        assert cache.get(scope, "second query", embedding=[0.99, 0.01, 0.0]) == "cached"
+        assert cache.get(scope, "third query", embedding=[0.0, 1.0, 0.0]) is None
+
+    def test_invalidate_clears_entries(self, cache, scope):
+        """Test invalidation drops both cache tiers"""
+        cache.put(scope, "query", "cached", embedding=[1.0, 0.0, 0.0])
+        cache.invalidate()
+
+        assert cache.get(scope, "query", embedding=[1.0, 0.0, 0.0]) is None
+
+    def test_semantic_tier_evicts_oldest(self, scope):
+        """Test the semantic tier keeps at most maxsize entries per scope"""
+        cache = ResponseCache(maxsize=2, ttl=60, similarity_threshold=0.95)
+        cache.put(scope, "a", "first", embedding=[1.0, 0.0, 0.0])
+        cache.put(scope, "b", "second", embedding=[0.0, 1.0, 0.0])
+        cache.put(scope, "c", "third", embedding=[0.0, 0.0, 1.0])
+
+        assert cache.get(scope, "x", embedding=[1.0, 0.0, 0.0]) is None
+        assert cache.get(scope, "y", embedding=[0.0, 0.0, 1.0]) == "third"
+
+    def test_semantic_scopes_are_bounded(self):
+        """Test the least recently used semantic scope is dropped past max_scopes"""
+        cache = ResponseCache(maxsize=2, ttl=60, similarity_threshold=0.95, max_scopes=2)
+        for prompt in ("a", "b", "c"):
+            cache.put(("m", prompt), "query", prompt, embedding=[1.0, 0.0, 0.0])
+
+        assert cache.get(("m", "a"), "other", embedding=[1.0, 0.0, 0.0]) is None
+        assert cache.get(("m", "c"), "other", embedding=[1.0, 0.0, 0.0]) == "c"